@@ -12,8 +12,31 @@ Classes:
     Instance: SQL Server LocalDB instance.  Do not instantiate directly; instead
         use the InstanceManager to create Instance objects.
     InstanceManager: Manages LocalDB instances.
+    ConnectionPool: Reuses open ODBC connections to instance databases.
+    FileLock: Cross-process lock, held around changes to an instance.
+    KeepAlive: Pings hot instances so they do not auto-stop when idle.
+    InstanceWatcher: Polls instances and notifies subscribers of changes.
+    Cassette: Records or replays SQLLocalDB.exe and SQL interactions, so
+        tests can run without LocalDB.
+
+Functions:
+    main: Command line interface, run as "python -m localdb".  Includes a
+        batch mode to run many operations in a single process.
+    run_operation: Runs an operation dictionary against an InstanceManager.
+    run_batch: Runs a list of operations, optionally concurrently.
+    run_load: Measures throughput and latency under concurrent clients.
+    shard_name: Maps parallel test workers to their own instance names.
+
+Agent:
+    AgentServer: Long-running process serving LocalDB operations over a local
+        socket, sharing one InstanceManager and ConnectionPool.
+    AgentClient: Client for the AgentServer with the InstanceManager methods.
 """
 
+import contextlib
+import datetime
+import enum
+import re
 from collections import namedtuple
 
 SQL_ATTACH = """
@@ -27,21 +50,195 @@ ALTER DATABASE [{dbname}] SET OFFLINE;
 USE master EXEC sp_detach_db @dbname = N'{dbname}';
 """
 
+SQL_BACKUP = """
+BACKUP DATABASE [{dbname}]
+TO {disks}
+WITH {options}
+"""
+
+SQL_RESTORE = """
+RESTORE DATABASE [{dbname}]
+FROM {disks}
+WITH {options}
+"""
+
+SQL_FILELIST = """
+RESTORE FILELISTONLY FROM {disks}
+"""
+
+SQL_HEADER = """
+RESTORE HEADERONLY FROM {disks}
+"""
+
+SQL_VERIFY = """
+RESTORE VERIFYONLY FROM {disks} WITH {checksum}
+"""
+
+SQL_CONFIGURE = """
+EXEC sp_configure N'show advanced options', 1;
+RECONFIGURE;
+{options}
+RECONFIGURE;
+"""
+
+# Instance.configure_resources keyword arguments and the sp_configure options
+# they set.
+RESOURCE_OPTIONS = {
+    'max_server_memory_mb': 'max server memory (MB)',
+    'min_server_memory_mb': 'min server memory (MB)',
+    'max_dop': 'max degree of parallelism',
+    'cost_threshold': 'cost threshold for parallelism',
+    'max_worker_threads': 'max worker threads',
+}
+
 ExecutableInfo = namedtuple(
     'ExecutableInfo',
     'path version regkey',
 )
 
 
-InstanceInfo = namedtuple(
-    'InstanceInfo',
-    'name version shared_name owner auto_create state last_start pipe_name',
+class Version(tuple):
+    """ Dotted version number as a tuple of integers, e.g. (13, 1, 4001, 0).
+
+    Compares like a tuple and prints in dotted form, so it can be passed
+    straight back to SQLLocalDB.exe.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, value=()):
+        if isinstance(value, str):
+            value = [int(part) for part in value.strip().split('.') if part]
+        return super().__new__(cls, value)
+
+    def __str__(self):
+        return '.'.join(str(part) for part in self)
+
+    def __repr__(self):
+        return f"Version('{self}')"
+
+
+class InstanceState(str, enum.Enum):
+    """ LocalDB instance state.  Compares equal to the SQLLocalDB.exe text.
+    """
+
+    RUNNING = 'Running'
+    STOPPED = 'Stopped'
+    UNKNOWN = 'Unknown'
+
+    # Print as the plain text, like the strings InstanceInfo used to hold.
+    # Enum's own methods give "InstanceState.RUNNING" on Python 3.11+.
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+    @classmethod
+    def parse(cls, text):
+        """ Returns the state for SQLLocalDB.exe text, or UNKNOWN.
+        """
+        return _STATES.get(text.strip().lower(), cls.UNKNOWN)
+
+
+_STATES = {state.value.lower(): state for state in InstanceState}
+
+# Formats of "Last start time", which follows the host's locale, plus the ISO
+# format used in JSON output.
+_TIMESTAMP_FORMATS = (
+    '%m/%d/%Y %I:%M:%S %p',
+    '%d/%m/%Y %H:%M:%S',
+    '%d.%m.%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+)
+
+
+def _parse_timestamp(text):
+    """ Parses a timestamp in any of _TIMESTAMP_FORMATS.  None if blank or
+    not recognized.
+    """
+    text = text.strip()
+    for fmt in _TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+class InstanceInfo(namedtuple(
+        'InstanceInfo',
+        'name version shared_name owner auto_create state last_start '
+        'pipe_name')):
+    """ Information about a LocalDB instance, as reported by SQLLocalDB.exe.
+
+    Fields:
+        name (str), version (Version, empty if unreadable), shared_name (str),
+        owner (str), auto_create (bool), state (InstanceState), last_start
+        (datetime, or None if unreadable), pipe_name (str, empty unless
+        running).
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Builds typed InstanceInfo from a dictionary of strings or values,
+        e.g. JSON output.
+        """
+        last_start = data.get('last_start', None)
+        if isinstance(last_start, str):
+            last_start = _parse_timestamp(last_start)
+        auto_create = data.get('auto_create') or False
+        if isinstance(auto_create, str):
+            auto_create = auto_create.strip().lower() in ('yes', 'true')
+        try:
+            version = Version(data.get('version') or ())
+        except (TypeError, ValueError):
+            version = Version()
+        return cls(
+            name=data.get('name') or '',
+            version=version,
+            shared_name=data.get('shared_name', '') or '',
+            owner=data.get('owner', '') or '',
+            auto_create=auto_create,
+            state=InstanceState.parse(data.get('state') or ''),
+            last_start=last_start,
+            pipe_name=data.get('pipe_name', '') or '',
+        )
+
+
+class ServerVersion(namedtuple(
+        'ServerVersion',
+        'name version major minor micro build')):
+    """ LocalDB version installed on the host.
+
+    Fields:
+        name (str), version (Version), major, minor, micro and build (int).
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Builds typed ServerVersion from a dictionary, e.g. JSON output.
+        """
+        version = Version(data['version'])
+        return cls(data['name'], version, *version[:4])
+
+
+# Emitted by InstanceWatcher.  The kind is one of EVENT_KINDS; old and new are
+# the InstanceInfo before and after the change (None if there was none).
+InstanceEvent = namedtuple(
+    'InstanceEvent',
+    'kind name old new',
 )
 
+EVENT_KINDS = ('created', 'deleted', 'started', 'stopped', 'share_changed')
 
-ServerVersion = namedtuple(
-    'ServerVersion',
-    'name version major minor micro build'
+
+# Returned by run_load.  Latencies are in seconds.
+LoadReport = namedtuple(
+    'LoadReport',
+    'clients duration requests errors qps mean p50 p90 p99 max',
 )
 
 
@@ -251,6 +448,277 @@ class CmdExecutor(object):
         return data[0]
 
 
+class FileLock(object):
+    """ Exclusive lock shared between processes via a lock file.
+
+    The lock is re-entrant within a thread and serializes threads of the same
+    process, so one FileLock object can be shared by all Instance objects in a
+    process.  Other processes contend for the operating system lock on the
+    file (msvcrt on Windows, fcntl elsewhere).  It is released automatically
+    if the holding process dies.
+    """
+
+    def __init__(self, path, timeout=None, poll=0.05):
+        """ Initialize the lock.  The lock file is not opened until acquired.
+
+        Args:
+            path (str): Lock file path.  Parent folders are created as needed.
+            timeout (float): Optional default seconds to wait in acquire.
+                Waits forever if omitted.
+            poll (float): Seconds between attempts to take the file lock.
+        """
+        import threading
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def acquire(self, timeout=None):
+        """ Waits for and takes the lock.
+
+        Args:
+            timeout (float): Optional seconds to wait, overriding the default.
+
+        Raises:
+            LocalDBError if the lock is not available in time.
+        """
+        import time
+
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        if not self._rlock.acquire(timeout=-1 if timeout is None else timeout):
+            raise LocalDBError(f'Timed out waiting for lock {self.path}.')
+        self._depth += 1
+        if self._depth > 1:
+            return
+
+        try:
+            self._file = self._lock_file(deadline)
+        except BaseException:
+            self._depth -= 1
+            self._rlock.release()
+            raise
+
+    def release(self):
+        """ Releases the lock.  Must be called by the thread holding it.
+        """
+        self._depth -= 1
+        if self._depth == 0:
+            f, self._file = self._file, None
+            self._unlock_file(f)
+        self._rlock.release()
+
+    def _lock_file(self, deadline):
+        """ Opens the lock file and takes the operating system lock on it.
+        """
+        import os
+        import time
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        f = open(self.path, 'a+')
+        while True:
+            try:
+                self._os_lock(f)
+                return f
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    f.close()
+                    raise LocalDBError(
+                        f'Timed out waiting for lock {self.path}.')
+                time.sleep(self.poll)
+
+    def _os_lock(self, f):
+        """ Tries once to lock the file, raising OSError if already locked.
+        """
+        import sys
+        if sys.platform.startswith('win'):
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_file(self, f):
+        import sys
+        try:
+            if sys.platform.startswith('win'):
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+
+def lock_path(name, lockdir=None):
+    """ Returns the lock file path for a LocalDB instance name.
+
+    Args:
+        name (str): Instance name.  Case insensitive, like LocalDB itself.
+        lockdir (str): Optional lock folder.  Defaults to a "localdb-locks"
+            folder in the temporary folder.
+    """
+    import os
+    import re
+    import tempfile
+
+    if lockdir is None:
+        lockdir = os.path.join(tempfile.gettempdir(), 'localdb-locks')
+    # Names that differ only in unsafe characters share a lock file; that
+    # only costs some extra serialization.
+    safe = re.sub(r'[^0-9a-z_.-]', '_', name.lower())
+    return os.path.join(lockdir, f'{safe}.lock')
+
+
+def worker_id(default='master'):
+    """ Returns the current pytest-xdist worker ID, e.g. "gw3".
+
+    Args:
+        default (str): Value returned when not running under pytest-xdist.
+    """
+    import os
+    return os.environ.get('PYTEST_XDIST_WORKER', default)
+
+
+def shard_name(base, worker=None, shards=None):
+    """ Maps a parallel test worker to its own instance or database name.
+
+    The mapping is deterministic, so each worker reuses the same name across
+    runs and no two workers share one (unless shards limits the count).
+
+    Examples:
+        shard_name('Test')                 -> 'Test' (no xdist), 'Test_gw2'
+        shard_name('Test', shards=2)       -> 'Test_0' or 'Test_1'
+        shard_name('Test', worker='gw5')   -> 'Test_gw5'
+
+    Args:
+        base (str): Base instance or database name.
+        worker (str): Optional worker ID.  Defaults to worker_id().
+        shards (int): Optional number of names to spread workers across.
+
+    Returns:
+        Name for this worker.  The base name if not running in a worker.
+    """
+    import re
+    import zlib
+
+    if worker is None:
+        worker = worker_id()
+    if worker == 'master':
+        return base
+    if shards is None:
+        return f'{base}_{worker}'
+
+    digits = re.findall(r'[0-9]+', worker)
+    if digits:
+        index = int(digits[-1])
+    else:
+        index = zlib.crc32(worker.encode('utf-8'))
+    return f'{base}_{index % shards}'
+
+
+class ConnectionPool(object):
+    """ Keeps open ODBC connections for reuse, keyed by connection string.
+
+    Connections are opened with autocommit on.  Share one pool between
+    Instance objects (via the InstanceManager) to avoid reconnecting for every
+    attach/detach.
+    """
+
+    def __init__(self, maxidle=4, connect=None):
+        """ Initialize an empty pool.
+
+        Args:
+            maxidle (int): Maximum idle connections kept per connection string.
+            connect (callable): Optional connection factory, called as
+                connect(dsn, autocommit=True).  Defaults to pyodbc.connect.
+        """
+        import threading
+        self.maxidle = maxidle
+        self._connect = connect
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, dsn):
+        """ Returns an idle connection for the DSN, or opens a new one.
+        """
+        with self._lock:
+            idle = self._idle.get(dsn, None)
+            if idle:
+                return idle.pop()
+        connect = self._connect
+        if connect is None:
+            import pyodbc
+            connect = pyodbc.connect
+        return connect(dsn, autocommit=True)
+
+    def release(self, dsn, conn, discard=False):
+        """ Returns a connection to the pool.
+
+        Args:
+            dsn (str): Connection string the connection was acquired with.
+            conn: The connection.
+            discard (bool): Set True to close the connection instead of
+                keeping it, e.g. after an error.
+        """
+        if not discard:
+            with self._lock:
+                idle = self._idle.setdefault(dsn, [])
+                if len(idle) < self.maxidle:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    @contextlib.contextmanager
+    def connection(self, dsn):
+        """ Context manager yielding a pooled connection for the DSN.
+        """
+        conn = self.acquire(dsn)
+        try:
+            yield conn
+        except BaseException:
+            self.release(dsn, conn, discard=True)
+            raise
+        self.release(dsn, conn)
+
+    def clear(self, dsn=None, prefix=None):
+        """ Closes idle connections, for one DSN or all of them.
+
+        Args:
+            dsn (str): Optional connection string to clear.
+            prefix (str): Optional, clears all connection strings starting
+                with this, e.g. all databases of one server.
+        """
+        with self._lock:
+            if dsn is not None:
+                keys = [dsn]
+            elif prefix is not None:
+                keys = [k for k in self._idle if k.startswith(prefix)]
+            else:
+                keys = list(self._idle)
+            conns = [c for k in keys for c in self._idle.pop(k, [])]
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                # Connections to a stopped instance may already be dead.
+                pass
+
+
 class Instance(object):
     """ Represents a LocalDB instance on the host computer.
 
@@ -260,9 +728,28 @@ class Instance(object):
     to create instead.
     """
 
-    def __init__(self, info):
+    # The ODBC driver search reads the registry, so the result is shared by
+    # all instances once found.
+    _driver = None
+
+    def __init__(self, info, pool=None, lock=None, exe=None, autostart=False,
+                 warmup=None, on_start=None):
         self._info = info
-        self._exe = CmdExecutor()
+        self._exe = exe if exe is not None else CmdExecutor()
+        self._pool = pool
+        if lock is None:
+            lock = FileLock(lock_path(info.name))
+        self._lock = lock
+        # Set autostart to start a stopped instance (and warm it up) when a
+        # connection string is requested.  See ensure_started.
+        self.autostart = autostart
+        self.warmup = list(warmup) if warmup is not None else ['SELECT 1']
+        # sp_configure settings applied by configure_resources, reapplied
+        # after reset.
+        self.resources = {}
+        # Called with this instance after start (including starts by
+        # ensure_started), e.g. so the manager can reapply its memory budget.
+        self.on_start = on_start
 
     @property
     def name(self):
@@ -273,16 +760,21 @@ class Instance(object):
         return self._info.version
 
     def start(self):
-        self._exe.call('start', name=self.name)
-        self._info = self._exe.call('info', name=self.name)
+        with self._lock:
+            self._exe.call('start', name=self.name)
+        self.refresh()
+        if self.on_start is not None:
+            self.on_start(self)
 
     def stop(self):
-        self._exe.call('stop', name=self.name)
-        self._info = self._exe.call('info', name=self.name)
+        with self._lock:
+            self._exe.call('stop', name=self.name)
+        self.refresh()
 
     def share(self, sharedname, owner=None):
-        self._exe.call('share', name=self.name, sharedname=sharedname,
-                       owner=owner)
+        with self._lock:
+            self._exe.call('share', name=self.name, sharedname=sharedname,
+                           owner=owner)
 
     def unshare(self, sharedname):
         self._exe.call('unshare', sharedname=sharedname)
@@ -290,17 +782,159 @@ class Instance(object):
     def info(self):
         return self._info
 
+    def refresh(self):
+        """ Reloads the instance information from SQLLocalDB.exe.
+        """
+        self._info = parse_info(self._exe.call('info', name=self.name))
+        return self._info
+
+    def _pipe_path(self):
+        """ Returns the instance's named pipe path from the cached info.
+
+        None if the instance was not running when last queried.
+        """
+        pipe = self._info.pipe_name or ''
+        if pipe.lower().startswith('np:'):
+            return pipe[3:]
+        return None
+
+    def is_ready(self, connect=False):
+        """ Checks whether the instance accepts connections, as cheaply as
+        possible.
+
+        Probes in order, stopping at the first that succeeds:
+            1. The named pipe from the cached info (Windows only, no process
+               or connection needed).
+            2. Optionally, a connection running "SELECT 1".
+            3. Refreshing the info, i.e. one SQLLocalDB.exe call.
+
+        Args:
+            connect (bool): Set True to try a connection probe.  Note LocalDB
+                starts a stopped instance when a client connects.
+
+        Returns:
+            True if the instance is running and its pipe is available.
+        """
+        pipe = self._pipe_path()
+        if pipe is not None and _pipe_exists(pipe):
+            return True
+
+        if connect:
+            try:
+                with self.connect() as conn:
+                    conn.execute('SELECT 1')
+                return True
+            except Exception:
+                pass
+
+        info = self.refresh()
+        if info.state != InstanceState.RUNNING:
+            return False
+        pipe = self._pipe_path()
+        if pipe is None:
+            return False
+        # Off Windows the pipe cannot be checked, so trust the state.
+        import sys
+        return _pipe_exists(pipe) or not sys.platform.startswith('win')
+
+    def wait_until_ready(self, timeout=30.0, connect=False, interval=0.02,
+                         max_interval=1.0):
+        """ Waits until the instance accepts connections, e.g. after start.
+
+        Polls is_ready with exponential backoff, so a fast start is noticed
+        within milliseconds while a slow one is not hammered with probes.
+
+        Args:
+            timeout (float): Maximum seconds to wait.
+            connect (bool): Set True to include a connection probe.
+            interval (float): Seconds before the first retry.
+            max_interval (float): Longest wait between probes.
+
+        Returns:
+            True when ready, False if the timeout expired first.
+        """
+        import time
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.is_ready(connect=connect):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
+
     def reset(self):
         """ Stops, deletes and recreates the instance. Use to detach all DBs.
+
+        Settings from configure_resources are applied to the new instance.
         """
-        self._exe.call('stop', name=self.name)
-        self._exe.call('delete', name=self.name)
-        self._exe.call(
-            'create',
-            name=self.name,
-            version=self.version,
-            start=True,
-        )
+        with self._lock:
+            self._exe.call('stop', name=self.name)
+            self._exe.call('delete', name=self.name)
+            self._exe.call(
+                'create',
+                name=self.name,
+                version=self.version,
+                start=True,
+            )
+        self.refresh()
+        if self._pool is not None:
+            self._pool.clear(prefix=self._server())
+        if self.resources:
+            if not self.wait_until_ready():
+                raise LocalDBError(
+                    f'LocalDB instance "{self.name}" did not start after '
+                    'reset, so its resource settings were not applied.')
+            self._apply_resources(self.resources)
+
+    def configure_resources(self, options=None, **kwargs):
+        """ Limits the memory and CPU the instance may use, via sp_configure.
+
+        Settings persist in the instance's master database, so survive
+        restarts, and are reapplied by reset.  Connecting starts the instance
+        if it is stopped.
+
+        Args:
+            options (dict): Optional, other sp_configure options by name, e.g.
+                {'optimize for ad hoc workloads': 1}.
+            kwargs: Any of:
+                max_server_memory_mb (int): Buffer pool limit (minimum 128).
+                min_server_memory_mb (int): Memory kept once acquired.
+                max_dop (int): Maximum degree of parallelism, 0 for all CPUs.
+                cost_threshold (int): Cost threshold for parallelism.
+                max_worker_threads (int): Worker thread limit, 0 for default.
+
+        Returns:
+            Dictionary of all settings applied to this instance so far.
+        """
+        settings = dict(options or {})
+        for key, value in kwargs.items():
+            if key not in RESOURCE_OPTIONS:
+                raise ValueError(f'Unknown resource setting "{key}".')
+            if value is not None:
+                settings[RESOURCE_OPTIONS[key]] = value
+
+        changed = {
+            k: v for k, v in settings.items() if self.resources.get(k) != v}
+        if changed:
+            self._apply_resources(changed)
+            self.resources.update(changed)
+        return dict(self.resources)
+
+    def _apply_resources(self, settings):
+        """ Runs sp_configure for the settings over a master connection.
+        """
+        lines = []
+        for name, value in settings.items():
+            name = name.replace("'", "''")
+            lines.append(f"EXEC sp_configure N'{name}', {int(value)};")
+        sql = SQL_CONFIGURE.format(options='\n'.join(lines))
+        with self.connect(autostart=False) as conn:
+            # Errors from later statements in the batch only surface when
+            # reading their result sets.
+            _execute_with_progress(conn, sql)
 
     def _is64bit(self):
         """ Determines if Python is running in 64-bit mode.
@@ -398,11 +1032,66 @@ class Instance(object):
             - https://docs.microsoft.com/en-us/sql/relational-databases/
                 native-client/sql-server-native-client
         """
-        drivers = self._all_drivers()
-        valid_drivers = self._valid_drivers(drivers)
-        return valid_drivers[0]
+        if Instance._driver is None:
+            drivers = self._all_drivers()
+            valid_drivers = self._valid_drivers(drivers)
+            Instance._driver = valid_drivers[0]
+        return Instance._driver
+
+    def ensure_started(self, timeout=30.0):
+        """ Starts the instance if stopped, then runs the warm-up statements.
+
+        Relies on the cached InstanceInfo state, so costs nothing when the
+        instance is known to be running.  On Windows a running instance whose
+        named pipe has gone (LocalDB stops idle instances) is re-queried.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the instance to
+                accept connections after starting.
+
+        Returns:
+            True if the instance was started, False if already running.
+        """
+        import sys
+
+        if self._info.state == InstanceState.RUNNING:
+            pipe = self._pipe_path()
+            if not sys.platform.startswith('win') or (
+                    pipe is not None and _pipe_exists(pipe)):
+                return False
+            if self.refresh().state == InstanceState.RUNNING:
+                return False
+
+        self.start()
+        if not self.wait_until_ready(timeout):
+            raise LocalDBError(
+                f'LocalDB instance "{self.name}" did not start in time.')
+        # Pooled connections from before the instance stopped are dead.
+        if self._pool is not None:
+            self._pool.clear(prefix=self._server())
+        self.warm_up()
+        return True
+
+    def warm_up(self):
+        """ Runs the warm-up statements, e.g. to prime the plan cache.
+
+        Each statement in the warmup list is either a SQL string run against
+        master, or a (dbname, sql) tuple.  Results are fetched and discarded.
+        """
+        for stmt in self.warmup:
+            if isinstance(stmt, str):
+                dbname, sql = None, stmt
+            else:
+                dbname, sql = stmt
+            with self.connect(dbname, autostart=False) as conn:
+                cursor = conn.execute(sql)
+                if cursor is not None and cursor.description:
+                    cursor.fetchall()
 
-    def connection_string(self, dbname=None):
+    def _server(self):
+        return f'Server={{(LocalDB)\\{self.name}}}'
+
+    def connection_string(self, dbname=None, autostart=None):
         """ Returns a valid DSN connection string for an instance database.
 
         This method does NOT check is the database is currently attached to this
@@ -413,11 +1102,19 @@ class Instance(object):
             dbname (str): Optional, valid database name in the instance.  If
                 not given, then the connection string is effectively for the
                 instance's master' database.
+            autostart (bool): Optional, set True to start (and warm up) the
+                instance first if it is stopped.  Defaults to the instance's
+                autostart attribute.
 
         Return:
             DSN connection string, e.g. for use in pyodbc.
         """
-        server = f'Server={{(LocalDB)\\{self.name}}}'
+        if autostart is None:
+            autostart = self.autostart
+        if autostart:
+            self.ensure_started()
+
+        server = self._server()
         driver = f'Driver={{{self.latest_driver()}}}'
         if dbname is not None:
             database = f'Database={{{dbname}}}'
@@ -446,6 +1143,30 @@ class Instance(object):
         dsn = urllib.parse.quote_plus(dsn)
         return f'mssql+pyodbc:///?odbc_connect={dsn}&autocommit=true'
 
+    @contextlib.contextmanager
+    def connect(self, dbname=None, autostart=None):
+        """ Context manager yielding an open connection to an instance database.
+
+        Uses the instance's connection pool if it has one, otherwise opens a
+        new connection and closes it afterwards.
+
+        Args:
+            dbname (str): Optional database name.  Connects to master if
+                omitted.
+            autostart (bool): Optional, see connection_string.
+        """
+        dsn = self.connection_string(dbname, autostart=autostart)
+        if self._pool is not None:
+            with self._pool.connection(dsn) as conn:
+                yield conn
+        else:
+            import pyodbc
+            conn = pyodbc.connect(dsn, autocommit=True)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
     # I haven't decided is database attachment/detachment should be part of this
     # interface.  It requires a ODBC driver package like pyodbc to work.
 
@@ -463,60 +1184,258 @@ class Instance(object):
         Returns:
             The database name inside the instance if successful.
         """
-        try:
-            import pyodbc
-        except ImportError:
-            raise
+        import os
 
         if dbname is None:
             dbname, _ = os.path.splitext(os.path.basename(filepath))
 
         try:
-            dsn = self.connection_string()
-            conn = pyodbc.connect(dsn, autocommit=True)
             sql = SQL_ATTACH.format(dbname=dbname, fpath=filepath)
-            conn.execute(sql)
-            conn.close()
-        except pyodbc.ProgrammingError as e:
-            info = parse_error(e.args[1])
-            raise LocalDBError(
-                info['SHORT'],
-                description=info['MSG'],
-                solution=info['SOLUTION']) from e
-        except pyodbc.Error as e:
-            info = parse_error(e.args[1])
-            raise LocalDBError(
-                info['SHORT'],
-                description=info['MSG'],
-                solution=info['SOLUTION']) from e
+            with self.connect() as conn:
+                conn.execute(sql)
+        except Exception as e:
+            error = _odbc_error(e)
+            if error is None:
+                raise
+            raise error from e
 
         return dbname
 
     def detach(self, dbname):
         try:
-            import pyodbc
-        except ImportError:
-            raise
-
-        try:
-            dsn = self.connection_string()
-            conn = pyodbc.connect(dsn, autocommit=True)
             sql = SQL_DETACH.format(dbname=dbname)
-            conn.execute(sql)
-            conn.close()
+            with self.connect() as conn:
+                conn.execute(sql)
 
         except RuntimeError as e:
             raise LocalDBError('Failed to detach SQL database!') from e
 
+    def backup(self, dbname, path, stripes=1, compression=None,
+               checksum=True, verify=False, progress=None, stats=10,
+               buffercount=None, maxtransfersize=None):
+        """ Backs up a database to one or more (striped) backup files.
+
+        Striping writes the backup to several files in parallel, which is
+        faster when they are on different disks.  Checks there is enough free
+        disk space for the backup before starting.
+
+        Args:
+            dbname (str): Database name in the instance.
+            path (str): Backup file path.  With stripes, the files are named
+                like "db_1.bak", "db_2.bak" for path "db.bak".  Files left at
+                the path by earlier backups with other stripe counts are
+                deleted, so restore finds only this backup.
+            stripes (int): Number of backup files to write in parallel.
+            compression (bool): Optional, set True or False to override the
+                server default.  LocalDB (an Express edition) does not
+                support compression, so True fails there.
+            checksum (bool): Set True to verify page checksums while backing
+                up and store a checksum of the backup.
+            verify (bool): Set True to check the backup is readable, and its
+                checksums valid (if checksum is set), afterwards.
+            progress (callable): Optional, called with the percentage done
+                (int) as SQL Server reports progress.
+            stats (int): Percentage interval for progress reports.
+            buffercount (int): Optional number of I/O buffers.
+            maxtransfersize (int): Optional largest transfer unit in bytes.
+
+        Returns:
+            List of backup file paths.
+        """
+        import os
+
+        paths = _stripe_paths(path, stripes)
+        options = ['FORMAT', 'INIT', f'STATS = {int(stats)}']
+        if checksum:
+            options.append('CHECKSUM')
+        if compression is not None:
+            options.append('COMPRESSION' if compression else 'NO_COMPRESSION')
+        if buffercount is not None:
+            options.append(f'BUFFERCOUNT = {int(buffercount)}')
+        if maxtransfersize is not None:
+            options.append(f'MAXTRANSFERSIZE = {int(maxtransfersize)}')
+        sql = SQL_BACKUP.format(
+            dbname=dbname.replace(']', ']]'),
+            disks=_disks(paths),
+            options=', '.join(options),
+        )
+
+        try:
+            with self.connect() as conn:
+                row = conn.execute(
+                    'SELECT SUM(CAST(size AS BIGINT)) * 8192 '
+                    'FROM sys.master_files WHERE database_id = DB_ID(?)',
+                    dbname).fetchone()
+                if row is None or row[0] is None:
+                    raise LocalDBError(f'No database "{dbname}" to back up.')
+                # Data and log file sizes bound the backup size.
+                _check_space(
+                    {os.path.dirname(os.path.abspath(paths[0])): row[0]})
+                _execute_with_progress(conn, sql, progress)
+                if verify:
+                    _execute_with_progress(conn, SQL_VERIFY.format(
+                        disks=_disks(paths),
+                        checksum='CHECKSUM' if checksum else 'NO_CHECKSUM'))
+        except Exception as e:
+            error = _odbc_error(e)
+            if error is None:
+                raise
+            raise error from e
+        for stale in _stale_stripes(path, stripes):
+            os.remove(stale)
+        return paths
+
+    def restore(self, path, dbname, replace=False, move_to=None,
+                checksum=None, progress=None, stats=10):
+        """ Restores a database from backup files made by backup.
+
+        The database files are placed in a target folder, named after the
+        database.  Checks there is enough free disk space for them first;
+        SQL Server then creates them at full size before restoring.
+
+        Args:
+            path (str or list of str): Backup file path.  Give the same path
+                as to backup, and any stripes are found automatically, or a
+                list of all the stripe files.
+            dbname (str): Database name to restore as.
+            replace (bool): Set True to overwrite an existing database.
+            move_to (str): Optional folder for the database files.  Defaults
+                to the instance's default data folder.
+            checksum (bool): Set True to verify backup checksums, failing if
+                any are wrong, or False not to.  Defaults to verifying them
+                if the backup has them.
+            progress (callable): Optional, called with the percentage done
+                (int) as SQL Server reports progress.
+            stats (int): Percentage interval for progress reports.
+
+        Returns:
+            The database name.
+        """
+        import os
+
+        if isinstance(path, str):
+            paths = [path] if os.path.exists(path) else _find_stripes(path)
+        else:
+            paths = list(path)
+        if not paths:
+            raise LocalDBError(f'No backup files found for {path}.')
+        disks = _disks(paths)
+
+        try:
+            with self.connect() as conn:
+                if move_to is None:
+                    move_to = conn.execute(
+                        "SELECT SERVERPROPERTY('InstanceDefaultDataPath')"
+                    ).fetchone()[0]
+                cursor = conn.execute(SQL_FILELIST.format(disks=disks))
+                columns = [d[0].lower() for d in cursor.description]
+                files = [dict(zip(columns, r)) for r in cursor.fetchall()]
+
+                options = []
+                targets = {}
+                for i, f in enumerate(files):
+                    if f['type'] == 'L':
+                        suffix = '_log.ldf'
+                    elif i == 0:
+                        suffix = '.mdf'
+                    else:
+                        suffix = f'_{i}.ndf'
+                    target = os.path.join(move_to, dbname + suffix)
+                    targets[target] = int(f['size'] or 0)
+                    logical = f['logicalname'].replace("'", "''")
+                    target = target.replace("'", "''")
+                    options.append(f"MOVE N'{logical}' TO N'{target}'")
+                _check_space({move_to: sum(targets.values())})
+
+                if checksum is None:
+                    cursor = conn.execute(SQL_HEADER.format(disks=disks))
+                    columns = [d[0].lower() for d in cursor.description]
+                    header = dict(zip(columns, cursor.fetchone() or ()))
+                    checksum = bool(header.get('hasbackupchecksums'))
+
+                options.append(f'STATS = {int(stats)}')
+                if checksum:
+                    options.append('CHECKSUM')
+                if replace:
+                    options.append('REPLACE')
+                sql = SQL_RESTORE.format(
+                    dbname=dbname.replace(']', ']]'),
+                    disks=disks,
+                    options=', '.join(options),
+                )
+                _execute_with_progress(conn, sql, progress)
+        except Exception as e:
+            error = _odbc_error(e)
+            if error is None:
+                raise
+            raise error from e
+        return dbname
+
 
 class InstanceManager(object):
     """ Manages installed LocalDB instances on the host computer.
     """
 
-    def __init__(self):
-        self.exe = CmdExecutor()
+    def __init__(self, pool=None, lockdir=None, exe=None, autostart=False,
+                 warmup=None):
+        """ Initialize the manager and discover installed instances.
+
+        Args:
+            pool (ConnectionPool): Optional connection pool shared by all
+                Instance objects from this manager.  If omitted, instances
+                open a new connection for each database operation.
+            lockdir (str): Optional folder for the cross-process instance lock
+                files.  Processes only exclude each other if they use the
+                same folder.  See lock_path for the default.
+            exe (CmdExecutor): Optional executor for SQLLocalDB.exe commands,
+                e.g. from a Cassette.  Defaults to a new CmdExecutor.
+            autostart (bool): Set True to have instances start (and warm up)
+                when stopped before handing out connection strings.
+            warmup (list): Optional warm-up statements for instances.  See
+                Instance.warm_up.  Defaults to "SELECT 1".
+        """
+        import threading
+        self.exe = exe if exe is not None else CmdExecutor()
+        self.pool = pool
+        self.autostart = autostart
+        self.warmup = warmup
+        self.keepalive = None
+        self.memory_budget = None
+        self.min_memory_mb = 256
+        self.lockdir = lockdir
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._budget_guard = threading.Lock()
         self._instances = self._findall()
 
+    def lock(self, name):
+        """ Returns the cross-process lock for the named instance.
+
+        The create, delete, start, stop and share operations (here and on
+        Instance objects) hold this lock, so concurrent processes, e.g.
+        pytest-xdist workers, cannot interleave changes to one instance.  Hold
+        it yourself to make a sequence of operations atomic:
+
+            with mngr.lock('Test'):
+                mngr.delete('Test')
+                mngr.create('Test')
+        """
+        key = name.lower()
+        with self._locks_guard:
+            lock = self._locks.get(key, None)
+            if lock is None:
+                lock = FileLock(lock_path(key, self.lockdir))
+                self._locks[key] = lock
+        return lock
+
+    def _new_instance(self, info):
+        """ Wraps InstanceInfo in an Instance sharing this manager's resources.
+        """
+        return Instance(
+            info, pool=self.pool, lock=self.lock(info.name), exe=self.exe,
+            autostart=self.autostart, warmup=self.warmup,
+            on_start=lambda inst: self._rebalance())
+
     def _findall(self):
         """ Gets a reference to all installed instances on this computer.
 
@@ -528,7 +1447,7 @@ class InstanceManager(object):
         names = self.info()
         for name in names:
             info = self.info(name)
-            inst = Instance(info)
+            inst = self._new_instance(info)
             instances[name.lower()] = inst
         return instances
 
@@ -551,12 +1470,32 @@ class InstanceManager(object):
             names = [n.lower() for n in self.info()]
             if lowername in names:
                 info = self.info(name)
-                inst = Instance(info)
+                inst = self._new_instance(info)
                 self._instances[name] = inst
             elif create:
                 return self.create(name)
         return inst
 
+    def update(self, info):
+        """ Replaces the cached information for an instance, e.g. with an
+        InstanceInfo seen by an InstanceWatcher.
+
+        Args:
+            info (InstanceInfo): Current information for the instance.  An
+                instance this manager has not seen yet is added.
+
+        Returns:
+            The Instance object.
+        """
+        key = info.name.lower()
+        inst = self._instances.get(key, None)
+        if inst is None:
+            inst = self._new_instance(info)
+            self._instances[key] = inst
+        else:
+            inst._info = info
+        return inst
+
     def create(self, name, version='', start=False):
         """ Create a new LocalDB instance with specified name and version.
 
@@ -571,12 +1510,15 @@ class InstanceManager(object):
         Returns:
             Reference to an Instance object if successful.
         """
-        self.exe.call('create', name=name, version=version, start=start)
+        with self.lock(name):
+            self.exe.call('create', name=name, version=version, start=start)
 
         # Save a reference to this instance for later use, and return it.
         info = self.info(name)
-        inst = Instance(info)
+        inst = self._new_instance(info)
         self._instances[name.lower()] = inst
+        if start:
+            self._rebalance()
         return inst
 
     def delete(self, name):
@@ -585,8 +1527,9 @@ class InstanceManager(object):
         Args:
             name (str): Valid LocalDB instance name.
         """
-        self.stop(name)
-        self.exe.call('delete', name=name)
+        with self.lock(name):
+            self.stop(name)
+            self.exe.call('delete', name=name)
         self._instances.pop(name.lower())
 
     def start(self, name):
@@ -595,7 +1538,9 @@ class InstanceManager(object):
         Args:
             name (str): Valid LocalDB instance name.
         """
-        self.exe.call('start', name=name)
+        with self.lock(name):
+            self.exe.call('start', name=name)
+        self._rebalance()
 
     def stop(self, name):
         """ Stops the named LocalDB instance, if it exists.
@@ -603,7 +1548,9 @@ class InstanceManager(object):
         Args:
             name (str): Valid LocalDB instance name.
         """
-        self.exe.call('stop', name=name)
+        with self.lock(name):
+            self.exe.call('stop', name=name)
+        self._rebalance()
 
     def share(self, name, sharedname, owner=None):
         """ Shares the named LocalDB instance to the share name.
@@ -613,7 +1560,9 @@ class InstanceManager(object):
             sharedname (str): Name for the share.
             owner (str): Optional, user or account UID.
         """
-        self.exe.call('share', name=name, sharedname=sharedname, owner=owner)
+        with self.lock(name):
+            self.exe.call(
+                'share', name=name, sharedname=sharedname, owner=owner)
 
     def unshare(self, sharedname):
         """ Unshares the shared LocalDB instance given the share name.
@@ -639,75 +1588,765 @@ class InstanceManager(object):
             (where name==instance name) InstanceInfo for LocalDB instance.
         """
         data = self.exe.call('info', name=name)
-        lines = data.splitlines()
         if name is None or name == '':
-            return lines
+            return data.splitlines()
         else:
-            keys = {
-                'name': 'name',
-                'version': 'version',
-                'shared name': 'shared_name',
-                'owner': 'owner',
-                'auto-create': 'auto_create',
-                'state': 'state',
-                'last start time': 'last_start',
-                'instance pipe name': 'pipe_name',
-            }
-            params = {}
-            for line in lines:
-                if (len(line) == 0) or (':' not in line):
-                    continue
-                key, value = line.split(':', maxsplit=1)
-                mappedkey = keys[key.lower().strip()]
-                params[mappedkey] = value.strip()
-            return InstanceInfo(**params)
+            return parse_info(data)
 
     def versions(self):
         """ Returns list of LocalDB versions installed on the host computer.
 
         Each list item is a ServerVersion namedtuple instance.
         """
-        import re
-        pattern = (
-            r'(?P<name>.*?)\((?P<version>(?P<major>[0-9]+?)\.'
-            r'(?P<minor>[0-9]+?)\.(?P<micro>[0-9]+?)\.(?P<build>[0-9]+?))\)'
-        )
-        data = self.exe.call('versions')
-        lines = data.splitlines()
-        vs = []
-        for line in lines:
-            matches = re.search(pattern, line)
-            if matches is not None:
-                v = ServerVersion(**matches.groupdict())
-                vs.append(v)
-        return vs
+        return parse_versions(self.exe.call('versions'))
 
     def trace(self, enable=True):
         self.exe.call('trace', enable=enable)
 
+    def set_memory_budget(self, total_mb, min_mb=256):
+        """ Shares a host memory cap between the running instances.
 
-class LocalDBError(RuntimeError):
+        Each running instance gets an equal share as its max server memory.
+        The shares are recalculated whenever this manager starts or stops an
+        instance, or one of its Instance objects starts (including by
+        ensure_started and KeepAlive).  Instances started outside this
+        manager, e.g. by LocalDB when something connects to a stopped
+        instance, are only counted at the next recalculation.  Set total_mb
+        to None to stop managing memory (instances keep their last settings).
 
-    def __init__(self, msg, *args, **kwargs):
-        """ Initialize the LocalDB error.
+        Raises LocalDBError, leaving the settings unchanged, if the running
+        instances cannot each have min_mb within the budget.
 
         Args:
-            msg = Short description.
+            total_mb (int): Memory, in MB, for all instances together.
+            min_mb (int): Smallest share for one instance (minimum 128).
 
-        Kwargs:
-            solution = Potential solutions, if any.
-            description = Long description.
+        Returns:
+            Dictionary of running instance name to its memory share in MB.
         """
-        super().__init__(self, msg, *args)
-        self.solution = kwargs.get('solution', '')
-        self.description = kwargs.get('description', '')
-        self.short_description = msg
+        self.memory_budget = total_mb
+        self.min_memory_mb = max(min_mb, 128)
+        return self.apply_memory_budget()
 
-    def __repr__(self):
-        return self.summary
+    def apply_memory_budget(self):
+        """ Applies the memory budget to the running instances.
 
-    @property
-    def summary(self):
+        Refreshes every instance's state first, so stopped instances are not
+        counted (or started again by connecting to them).  Only instances
+        whose share changed are reconfigured.
+
+        Returns:
+            Dictionary of running instance name to its memory share in MB.
+        """
+        if self.memory_budget is None:
+            return {}
+        with self._budget_guard:
+            running = []
+            for inst in list(self._instances.values()):
+                try:
+                    state = inst.refresh().state
+                except LocalDBError:
+                    # Deleted by another process since it was found.
+                    continue
+                if state == InstanceState.RUNNING:
+                    running.append(inst)
+            if not running:
+                return {}
+            share = int(self.memory_budget // len(running))
+            if share < self.min_memory_mb:
+                raise LocalDBError(
+                    f'Memory budget of {self.memory_budget} MB cannot give '
+                    f'{len(running)} running instances {self.min_memory_mb} '
+                    'MB each.',
+                    solution='Stop some instances, or raise the budget.')
+            for inst in running:
+                inst.configure_resources(max_server_memory_mb=share)
+            return {inst.name: share for inst in running}
+
+    def _rebalance(self):
+        """ Reapplies the memory budget after an instance changed state.
+        """
+        if self.memory_budget is not None:
+            self.apply_memory_budget()
+
+    def mark_hot(self, name, hot=True, interval=60.0):
+        """ Keeps the named instance from auto-stopping when idle.
+
+        Hot instances are pinged by a KeepAlive thread owned by this manager,
+        started when the first instance is marked hot.
+
+        Args:
+            name (str): Valid LocalDB instance name.
+            hot (bool): Set False to stop keeping the instance alive.
+            interval (float): Seconds between pings, used when starting the
+                KeepAlive.  Must be shorter than the instance's idle
+                shutdown time (5 minutes by default).
+        """
+        inst = self.get(name)
+        if inst is None:
+            raise LocalDBError(f'LocalDB instance "{name}" does not exist.')
+        if not hot:
+            if self.keepalive is not None:
+                self.keepalive.discard(inst)
+            return
+        if self.keepalive is None:
+            self.keepalive = KeepAlive(interval)
+            self.keepalive.start()
+        self.keepalive.add(inst)
+
+    def wait_all(self, names=None, timeout=30.0, connect=False):
+        """ Waits until several instances accept connections.
+
+        The instances are probed concurrently, sharing one deadline.  See
+        Instance.wait_until_ready.
+
+        Args:
+            names (list of str): Optional instance names.  Defaults to all
+                known instances.
+            timeout (float): Maximum seconds to wait overall.
+            connect (bool): Set True to include a connection probe.
+
+        Returns:
+            Dictionary of instance name to True (ready) or False (timed out).
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        if names is None:
+            names = [inst.name for inst in self._instances.values()]
+        if not names:
+            return {}
+        deadline = time.monotonic() + timeout
+
+        def wait(name):
+            inst = self.get(name)
+            if inst is None:
+                return False
+            remaining = max(deadline - time.monotonic(), 0)
+            return inst.wait_until_ready(remaining, connect=connect)
+
+        with ThreadPoolExecutor(max_workers=len(names)) as pool:
+            return dict(zip(names, pool.map(wait, names)))
+
+
+class KeepAlive(object):
+    """ Pings hot instances periodically so LocalDB does not auto-stop them.
+
+    Each ping opens a connection with autostart on and runs "SELECT 1", so an
+    instance that stopped anyway is started and warmed up again.
+    """
+
+    def __init__(self, interval=60.0):
+        """ Initialize the scheduler.  Call start to begin pinging.
+
+        Args:
+            interval (float): Seconds between pings.
+        """
+        import threading
+        self.interval = interval
+        self.errors = {}
+        self._instances = {}
+        self._guard = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def add(self, inst):
+        """ Marks an Instance as hot.
+        """
+        with self._guard:
+            self._instances[inst.name.lower()] = inst
+
+    def discard(self, inst):
+        """ Stops keeping an Instance alive.
+        """
+        with self._guard:
+            self._instances.pop(inst.name.lower(), None)
+
+    def ping_all(self):
+        """ Pings every hot instance once.
+
+        Errors are stored in the errors dictionary (keyed by lower-case name)
+        rather than raised, so one broken instance does not stop the others.
+        """
+        with self._guard:
+            instances = list(self._instances.items())
+        for key, inst in instances:
+            try:
+                with inst.connect(autostart=True) as conn:
+                    conn.execute('SELECT 1')
+            except Exception as e:
+                self.errors[key] = e
+            else:
+                self.errors.pop(key, None)
+
+    def start(self):
+        """ Starts pinging on a background thread.
+        """
+        import threading
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.ping_all()
+
+
+class InstanceWatcher(object):
+    """ Watches LocalDB instances and notifies subscribers of changes.
+
+    One poll loop serves every subscriber.  Each poll lists the instances once
+    and diffs their InstanceInfo against the cached copy, emitting
+    InstanceEvent tuples.  On Windows, running instances whose named pipe is
+    still open are assumed unchanged, so they cost no SQLLocalDB.exe call;
+    every full_every polls all instances are queried to catch share changes.
+    A running instance whose start time or pipe changed between polls has
+    restarted, and is reported as stopped then started.  Every changed
+    InstanceInfo is passed to the manager's update method, so its cached
+    Instance objects stay current.
+
+    The poll interval adapts: it drops to min_interval after a change and
+    grows towards max_interval while nothing changes.  Read the latest known
+    states from memory with latest and snapshot.
+    """
+
+    def __init__(self, manager, min_interval=1.0, max_interval=30.0,
+                 full_every=10):
+        """ Initialize the watcher.  Call start to poll in the background.
+
+        Args:
+            manager (InstanceManager): Manager used to query instances.  Its
+                cached Instance information is updated as changes are seen.
+            min_interval (float): Shortest seconds between polls.
+            max_interval (float): Longest seconds between polls.
+            full_every (int): Query every instance on this many polls.
+        """
+        import threading
+        self.manager = manager
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.full_every = full_every
+        self.interval = min_interval
+        self.last_error = None
+        self._infos = None
+        self._polls = 0
+        self._subscribers = []
+        self._guard = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def subscribe(self, callback, kinds=None):
+        """ Calls callback(event) for each InstanceEvent.
+
+        Callbacks run on the polling thread, so should return quickly.
+        Exceptions they raise are stored in last_error and otherwise ignored.
+
+        Args:
+            callback (callable): Function taking an InstanceEvent.
+            kinds (list of str): Optional, only these EVENT_KINDS.
+        """
+        if kinds is not None:
+            unknown = set(kinds) - set(EVENT_KINDS)
+            if unknown:
+                raise ValueError(f'Unknown event kinds: {sorted(unknown)}')
+            kinds = frozenset(kinds)
+        with self._guard:
+            self._subscribers.append((callback, kinds))
+
+    def unsubscribe(self, callback):
+        with self._guard:
+            self._subscribers = [
+                s for s in self._subscribers if s[0] != callback]
+
+    def latest(self, name):
+        """ Returns the last seen InstanceInfo for the name, or None.
+        """
+        with self._guard:
+            return (self._infos or {}).get(name.lower(), None)
+
+    def snapshot(self):
+        """ Returns a dictionary of lower-case instance name to InstanceInfo.
+        """
+        with self._guard:
+            return dict(self._infos or {})
+
+    def poll(self):
+        """ Polls the instances once and emits events for any changes.
+
+        The first poll only records the current states.
+
+        Returns:
+            List of InstanceEvent tuples emitted.
+        """
+        with self._guard:
+            previous = self._infos
+        full = previous is None or self._polls % self.full_every == 0
+        self._polls += 1
+
+        current = {}
+        for name in self.manager.info():
+            key = name.lower()
+            old = (previous or {}).get(key, None)
+            if not full and old is not None and self._unchanged(old):
+                current[key] = old
+                continue
+            try:
+                current[key] = self.manager.info(name)
+            except Exception as e:
+                # Usually deleted since the listing.  Keep the last known
+                # state; the next listing reports the deletion.
+                self.last_error = e
+                if old is not None:
+                    current[key] = old
+
+        events = []
+        if previous is not None:
+            events = self._diff(previous, current)
+        with self._guard:
+            self._infos = current
+            subscribers = list(self._subscribers)
+
+        for key, info in current.items():
+            if info != (previous or {}).get(key, None):
+                self.manager.update(info)
+
+        for event in events:
+            for callback, kinds in subscribers:
+                if kinds is None or event.kind in kinds:
+                    try:
+                        callback(event)
+                    except Exception as e:
+                        self.last_error = e
+
+        if events:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        return events
+
+    def _unchanged(self, info):
+        """ True if a running instance's pipe shows it is still running.
+        """
+        pipe = info.pipe_name or ''
+        return (
+            info.state == InstanceState.RUNNING
+            and pipe.lower().startswith('np:')
+            and _pipe_exists(pipe[3:])
+        )
+
+    def _diff(self, previous, current):
+        """ Compares two snapshots, returning the InstanceEvent tuples.
+        """
+        events = []
+        for key, new in current.items():
+            old = previous.get(key, None)
+            if old is None:
+                events.append(InstanceEvent('created', new.name, None, new))
+                continue
+            was_running = old.state == InstanceState.RUNNING
+            is_running = new.state == InstanceState.RUNNING
+            restarted = was_running and is_running and (
+                old.last_start != new.last_start
+                or old.pipe_name != new.pipe_name)
+            if was_running and (restarted or not is_running):
+                events.append(InstanceEvent('stopped', new.name, old, new))
+            if is_running and (restarted or not was_running):
+                events.append(InstanceEvent('started', new.name, old, new))
+            if (old.shared_name or '') != (new.shared_name or ''):
+                events.append(
+                    InstanceEvent('share_changed', new.name, old, new))
+        for key, old in previous.items():
+            if key not in current:
+                events.append(InstanceEvent('deleted', old.name, old, None))
+        return events
+
+    def start(self):
+        """ Starts polling on a background thread.
+        """
+        import threading
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the background thread.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                self.last_error = e
+                self.interval = self.max_interval
+            if self._stopping.wait(self.interval):
+                return
+
+
+class Cassette(object):
+    """ Records SQLLocalDB.exe calls and SQL exchanges, or replays them.
+
+    In record mode the cassette wraps a real CmdExecutor and ODBC connections,
+    capturing every command (with its output and duration) and every SQL
+    statement (with its result sets and messages).  In replay mode it serves
+    the recorded responses back without LocalDB, pyodbc or Windows, so code
+    built on this module can be tested on any platform.
+
+    Use the cassette as a context manager and build the InstanceManager with
+    its manager method:
+
+        with Cassette('tests/attach.json', mode='replay') as tape:
+            mngr = tape.manager()
+            mngr.get('Test').attach(r'C:\\data\\test.mdf')
+
+    Replay matches commands on their name and arguments, and SQL on the
+    statement text and parameters, serving repeated requests in recorded
+    order.  Once the recordings for a request run out, the last one is served
+    again.  ODBC errors replay as the LocalDBError a live run would raise.
+    Files ending ".gz" are compressed.
+    """
+
+    def __init__(self, path, mode='replay', latency=False, executor=None,
+                 connect=None):
+        """ Initialize the cassette, loading it if replaying.
+
+        Args:
+            path (str): Cassette file path.
+            mode (str): "record" or "replay".
+            latency (bool or float): Replay only.  Set True to sleep for the
+                recorded duration of each response, or a number to scale the
+                recorded durations, e.g. for performance regression tests.
+            executor (CmdExecutor): Record only.  Optional executor to record,
+                defaults to a new CmdExecutor.
+            connect (callable): Record only.  Optional connection factory to
+                record, defaults to pyodbc.connect.
+        """
+        import threading
+
+        if mode not in ('record', 'replay'):
+            raise ValueError(f'Unknown cassette mode "{mode}".')
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._executor = executor
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._saved_driver = None
+        self.driver = None
+        self.calls = []
+        self.sql = []
+        if mode == 'replay':
+            self.load()
+        self._queues = {}
+
+    def __enter__(self):
+        # Replay serves connection strings with the recorded ODBC driver, as
+        # the driver search needs the Windows registry.
+        self._saved_driver = Instance._driver
+        if self.mode == 'replay' and self.driver is not None:
+            Instance._driver = self.driver
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == 'record':
+            self.driver = Instance._driver
+            self.save()
+        Instance._driver = self._saved_driver
+
+    def _open(self, mode):
+        if self.path.endswith('.gz'):
+            import gzip
+            return gzip.open(self.path, mode + 't', encoding='utf-8')
+        return open(self.path, mode, encoding='utf-8')
+
+    def load(self):
+        """ Reads the recordings from the cassette file.
+        """
+        import json
+        with self._open('r') as f:
+            data = json.load(f)
+        self.driver = data.get('driver', None)
+        self.calls = data.get('calls', [])
+        self.sql = data.get('sql', [])
+
+    def save(self):
+        """ Writes the recordings to the cassette file.
+        """
+        import json
+        data = {
+            'version': 1,
+            'driver': self.driver,
+            'calls': self.calls,
+            'sql': self.sql,
+        }
+        with self._open('w') as f:
+            json.dump(data, f, separators=(',', ':'), default=str)
+
+    def executor(self):
+        """ Returns a CmdExecutor stand-in that records or replays commands.
+        """
+        return _CassetteExecutor(self)
+
+    def connect(self, dsn, autocommit=True):
+        """ Connection factory that records or replays SQL, like pyodbc.connect.
+        """
+        if self.mode == 'replay':
+            return _CassetteConnection(self, None)
+        connect = self._connect
+        if connect is None:
+            import pyodbc
+            connect = pyodbc.connect
+        return _CassetteConnection(self, connect(dsn, autocommit=autocommit))
+
+    def manager(self, **kwargs):
+        """ Returns an InstanceManager using this cassette for all I/O.
+
+        Args:
+            kwargs: Other arguments for the InstanceManager.
+        """
+        kwargs.setdefault('pool', ConnectionPool(connect=self.connect))
+        return InstanceManager(exe=self.executor(), **kwargs)
+
+    @staticmethod
+    def _key(*parts):
+        import json
+        return json.dumps(parts, sort_keys=True, default=str)
+
+    def _record(self, entries, entry, elapsed):
+        entry['elapsed'] = round(elapsed, 6)
+        with self._lock:
+            entries.append(entry)
+
+    def _replay(self, kind, key):
+        """ Returns the next recorded entry matching the key.
+        """
+        import builtins
+        import time
+
+        with self._lock:
+            queue = self._queues.get((kind, key), None)
+            if queue is None:
+                if kind == 'calls':
+                    queue = [
+                        e for e in self.calls
+                        if self._key(e['cmd'], e['kwargs']) == key
+                    ]
+                else:
+                    queue = [
+                        e for e in self.sql
+                        if self._key(e['sql'], e.get('params', [])) == key
+                    ]
+                self._queues[(kind, key)] = queue
+            if not queue:
+                raise LocalDBError(
+                    f'No recording in cassette {self.path} for {key}.')
+            entry = queue.pop(0) if len(queue) > 1 else queue[0]
+
+        if self.latency:
+            scale = 1.0 if self.latency is True else float(self.latency)
+            time.sleep(entry['elapsed'] * scale)
+        if entry.get('error') is not None:
+            error = entry['error']
+            if error.get('module', None) == 'pyodbc':
+                # Translate as a live ODBC error would be, e.g. by attach.
+                raise _odbc_error_from_args(error['args'])
+            if error['type'] in ('RuntimeError', 'ValueError',
+                                 'NotImplementedError'):
+                raise getattr(builtins, error['type'])(*error['args'])
+            raise LocalDBError(
+                f'{error["type"]}: {error["args"]}',
+                description=str(error['args']))
+        return entry
+
+
+class _CassetteExecutor(object):
+    """ CmdExecutor stand-in used by Cassette.
+    """
+
+    def __init__(self, cassette):
+        self.cassette = cassette
+        if cassette.mode == 'record':
+            inner = cassette._executor
+            self._inner = inner if inner is not None else CmdExecutor()
+        else:
+            self._inner = None
+
+    @property
+    def available(self):
+        return self._inner is None or self._inner.available
+
+    @property
+    def exe_path(self):
+        return None if self._inner is None else self._inner.exe_path
+
+    def call(self, cmd, **kwargs):
+        import time
+
+        tape = self.cassette
+        cmd = cmd.lower()
+        if tape.mode == 'replay':
+            return tape._replay('calls', tape._key(cmd, kwargs))['stdout']
+
+        entry = {'cmd': cmd, 'kwargs': kwargs, 'stdout': None, 'error': None}
+        start = time.perf_counter()
+        try:
+            entry['stdout'] = self._inner.call(cmd, **kwargs)
+        except Exception as e:
+            entry['error'] = {
+                'type': type(e).__name__,
+                'module': type(e).__module__,
+                'args': list(e.args),
+            }
+            raise
+        finally:
+            tape._record(tape.calls, entry, time.perf_counter() - start)
+        return entry['stdout']
+
+
+class _CassetteConnection(object):
+    """ ODBC connection stand-in used by Cassette.  Supports execute only.
+    """
+
+    def __init__(self, cassette, conn):
+        self.cassette = cassette
+        self._conn = conn
+
+    def execute(self, sql, *params):
+        import time
+
+        tape = self.cassette
+        params = list(params)
+        if tape.mode == 'replay':
+            entry = tape._replay('sql', tape._key(sql, params))
+            return _CassetteCursor(entry['results'])
+
+        entry = {'sql': sql, 'params': params, 'results': [], 'error': None}
+        start = time.perf_counter()
+        try:
+            cursor = self._conn.execute(sql, *params)
+            while True:
+                desc = cursor.description
+                messages = getattr(cursor, 'messages', None) or []
+                entry['results'].append({
+                    'columns': [d[0] for d in desc] if desc else None,
+                    'rows': [list(r) for r in cursor.fetchall()]
+                    if desc else None,
+                    'messages': [m[1] for m in messages],
+                })
+                if not cursor.nextset():
+                    break
+        except Exception as e:
+            entry['error'] = {
+                'type': type(e).__name__,
+                'module': type(e).__module__,
+                'args': list(e.args),
+            }
+            raise
+        finally:
+            tape._record(tape.sql, entry, time.perf_counter() - start)
+        return _CassetteCursor(entry['results'])
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+class _CassetteCursor(object):
+    """ Cursor over recorded result sets, as returned by _CassetteConnection.
+    """
+
+    def __init__(self, results):
+        self._results = results or [{}]
+        self._index = 0
+        self._load()
+
+    def _load(self):
+        result = self._results[self._index]
+        columns = result.get('columns', None)
+        if columns is None:
+            self.description = None
+        else:
+            self.description = [(c, None, None, None, None, None, None)
+                                for c in columns]
+        self._rows = [tuple(r) for r in result.get('rows', None) or []]
+        self.messages = [('', m) for m in result.get('messages', [])]
+
+    def nextset(self):
+        if self._index + 1 >= len(self._results):
+            return False
+        self._index += 1
+        self._load()
+        return True
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchval(self):
+        row = self.fetchone()
+        return None if row is None else row[0]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class LocalDBError(RuntimeError):
+
+    def __init__(self, msg, *args, **kwargs):
+        """ Initialize the LocalDB error.
+
+        Args:
+            msg = Short description.
+
+        Kwargs:
+            solution = Potential solutions, if any.
+            description = Long description.
+        """
+        super().__init__(self, msg, *args)
+        self.solution = kwargs.get('solution', '')
+        self.description = kwargs.get('description', '')
+        self.short_description = msg
+
+    def __repr__(self):
+        return self.summary
+
+    @property
+    def summary(self):
         """ Returns a string summarizing all exception information.
         """
         return (
@@ -717,6 +2356,190 @@ class LocalDBError(RuntimeError):
         ).format(desc=self.description, soln=self.solution)
 
 
+def _pipe_exists(path):
+    """ Returns True if the Windows named pipe exists.  Always False elsewhere.
+    """
+    import sys
+    if not sys.platform.startswith('win'):
+        return False
+    import _winapi
+    try:
+        _winapi.WaitNamedPipe(path, 1)
+    except OSError as e:
+        # ERROR_SEM_TIMEOUT: the pipe exists but all its instances are busy.
+        return getattr(e, 'winerror', None) == 121
+    return True
+
+
+_INFO_KEYS = {
+    'name': 'name',
+    'version': 'version',
+    'shared name': 'shared_name',
+    'owner': 'owner',
+    'auto-create': 'auto_create',
+    'state': 'state',
+    'last start time': 'last_start',
+    'instance pipe name': 'pipe_name',
+}
+
+_INFO_RE = re.compile(
+    r'^[ \t]*(' + '|'.join(re.escape(k) for k in _INFO_KEYS) + r')[ \t]*:'
+    r'[ \t]*(.*?)[ \t\r]*$',
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_VERSION_RE = re.compile(
+    r'^[ \t]*(.*?)[ \t]*\(([0-9]+)\.([0-9]+)\.([0-9]+)\.([0-9]+)\)',
+    re.MULTILINE,
+)
+
+
+def parse_info(data):
+    """ Parses SQLLocalDB.exe "info <name>" output into an InstanceInfo.
+
+    Scans the output once with a precompiled pattern.  Unrecognized lines are
+    ignored.
+
+    Args:
+        data (str): Command output.
+
+    Raises:
+        LocalDBError if the output has no instance name, e.g. an error
+        message from SQLLocalDB.exe.
+    """
+    params = {}
+    for m in _INFO_RE.finditer(data):
+        params[_INFO_KEYS[m.group(1).lower()]] = m.group(2)
+    if not params.get('name', None):
+        raise LocalDBError(
+            'Unexpected SQLLocalDB.exe info output.', description=data)
+    return InstanceInfo.from_dict(params)
+
+
+def parse_versions(data):
+    """ Parses SQLLocalDB.exe "versions" output into ServerVersion tuples.
+
+    Args:
+        data (str): Command output.
+    """
+    versions = []
+    for m in _VERSION_RE.finditer(data):
+        name, major, minor, micro, build = m.groups()
+        parts = (int(major), int(minor), int(micro), int(build))
+        versions.append(ServerVersion(
+            name, Version(parts), parts[0], parts[1], parts[2], parts[3]))
+    return versions
+
+
+_PROGRESS_RE = re.compile(r'([0-9]+) percent processed')
+
+
+def _stripe_paths(path, stripes):
+    """ Returns the backup file paths for a number of stripes.
+    """
+    import os
+    if stripes <= 1:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f'{root}_{i}{ext}' for i in range(1, stripes + 1)]
+
+
+def _find_stripes(path):
+    """ Returns the existing stripe files written by backup for a path.
+    """
+    import os
+    root, ext = os.path.splitext(path)
+    paths = []
+    while os.path.exists(f'{root}_{len(paths) + 1}{ext}'):
+        paths.append(f'{root}_{len(paths) + 1}{ext}')
+    return paths
+
+
+def _stale_stripes(path, stripes):
+    """ Returns files at a backup path that are not part of a backup with a
+    number of stripes, i.e. left over from earlier backups.
+    """
+    import os
+    root, ext = os.path.splitext(path)
+    if stripes <= 1:
+        stale, i = [], 1
+    else:
+        stale = [path] if os.path.exists(path) else []
+        i = stripes + 1
+    while os.path.exists(f'{root}_{i}{ext}'):
+        stale.append(f'{root}_{i}{ext}')
+        i += 1
+    return stale
+
+
+def _disks(paths):
+    """ Formats backup file paths as a T-SQL backup device list.
+    """
+    return ', '.join(
+        "DISK = N'{}'".format(p.replace("'", "''")) for p in paths)
+
+
+def _check_space(needed):
+    """ Raises LocalDBError unless the folders have enough free space.
+
+    Args:
+        needed (dict): Folder path to bytes needed.  Folders that cannot be
+            checked from here, e.g. missing ones, are skipped.
+    """
+    import shutil
+    for folder, size in needed.items():
+        try:
+            free = shutil.disk_usage(folder).free
+        except OSError:
+            continue
+        if size > free:
+            raise LocalDBError(
+                f'Not enough disk space in {folder}.',
+                description=f'Need {size} bytes, {free} bytes free.')
+
+
+def _execute_with_progress(conn, sql, progress=None):
+    """ Runs a statement, passing "N percent processed" messages to progress.
+
+    Reads every result set, as SQL Server reports progress (and any errors)
+    as the statement runs.  Use it without progress for any multi-statement
+    batch whose errors must not be lost.
+    """
+    cursor = conn.execute(sql)
+    done = 0
+    while True:
+        for _, message in getattr(cursor, 'messages', None) or []:
+            m = _PROGRESS_RE.search(message)
+            if m is not None and progress is not None:
+                done = int(m.group(1))
+                progress(done)
+        if not cursor.nextset():
+            break
+    if progress is not None and done < 100:
+        progress(100)
+
+
+def _odbc_error(e):
+    """ Returns a LocalDBError for an ODBC error, or None for other errors.
+
+    Checks the exception's module, so pyodbc need not be importable, e.g. when
+    replaying a Cassette.
+    """
+    if type(e).__module__ != 'pyodbc':
+        return None
+    return _odbc_error_from_args(e.args)
+
+
+def _odbc_error_from_args(args):
+    """ Returns a LocalDBError for the arguments of a pyodbc error.
+    """
+    info = parse_error(args[1]) if len(args) > 1 else None
+    if info is None:
+        return LocalDBError(' '.join(str(a) for a in args))
+    return LocalDBError(
+        info['SHORT'], description=info['MSG'], solution=info['SOLUTION'])
+
+
 def parse_error(msg):
     """ Parses MS SQL Server error messages into a dictionary.
 
@@ -808,7 +2631,958 @@ def parse_error(msg):
         return None
 
 
+def _jsonable(obj):
+    """ Converts operation results into JSON serializable objects.
+
+    Named tuples become dictionaries and Instance objects are represented by
+    their InstanceInfo.
+    """
+    if isinstance(obj, Instance):
+        obj = obj.info()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, Version):
+        return str(obj)
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    if hasattr(obj, '_asdict'):
+        return {k: _jsonable(v) for k, v in obj._asdict().items()}
+    if isinstance(obj, dict):
+        return {k: _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    return obj
+
+
+def _instance_op(method):
+    """ Builds an operation handler that calls a method on a named Instance.
+    """
+    def handler(mngr, name, **kwargs):
+        inst = mngr.get(name)
+        if inst is None:
+            raise LocalDBError(f'LocalDB instance "{name}" does not exist.')
+        return getattr(inst, method)(**kwargs)
+    return handler
+
+
+def _wait_op(mngr, name, **kwargs):
+    """ Waits for an instance, failing the operation if it times out.
+    """
+    if not _instance_op('wait_until_ready')(mngr, name, **kwargs):
+        raise LocalDBError(f'LocalDB instance "{name}" was not ready in time.')
+    return True
+
+
+# Operations understood by run_operation (and so by the command line batch
+# mode).  Each handler takes the InstanceManager plus the operation arguments.
+OPERATIONS = {
+    'create': lambda mngr, **kw: mngr.create(**kw),
+    'delete': lambda mngr, **kw: mngr.delete(**kw),
+    'start': lambda mngr, **kw: mngr.start(**kw),
+    'stop': lambda mngr, **kw: mngr.stop(**kw),
+    'share': lambda mngr, **kw: mngr.share(**kw),
+    'unshare': lambda mngr, **kw: mngr.unshare(**kw),
+    'info': lambda mngr, **kw: mngr.info(**kw),
+    'versions': lambda mngr, **kw: mngr.versions(**kw),
+    'trace': lambda mngr, **kw: mngr.trace(**kw),
+    'connstring': _instance_op('connection_string'),
+    'url': _instance_op('url'),
+    'attach': _instance_op('attach'),
+    'detach': _instance_op('detach'),
+    'wait': _wait_op,
+    'configure': _instance_op('configure_resources'),
+    'budget': lambda mngr, **kw: mngr.set_memory_budget(**kw),
+    'backup': _instance_op('backup'),
+    'restore': _instance_op('restore'),
+}
+
+
+def run_operation(mngr, op):
+    """ Runs a single operation against an InstanceManager.
+
+    Args:
+        mngr (InstanceManager): Manager to run the operation with.
+        op (dict): Operation name under the "op" key, plus keyword arguments
+            for the operation, e.g. {"op": "create", "name": "Test"}.
+
+    Returns:
+        The operation result, converted to JSON serializable objects.
+    """
+    kwargs = dict(op)
+    cmd = kwargs.pop('op', None)
+    if cmd is None:
+        raise ValueError(f'Operation has no "op" key: {op!r}')
+    handler = OPERATIONS.get(cmd.lower(), None)
+    if handler is None:
+        raise NotImplementedError(f'LocalDB operation "{cmd}" not supported.')
+    return _jsonable(handler(mngr, **kwargs))
+
+
+def run_batch(mngr, ops, jobs=1, stop_on_error=False):
+    """ Runs many operations in this process, optionally concurrently.
+
+    Args:
+        mngr (InstanceManager): Manager to run the operations with.
+        ops (list of dict): Operations, as accepted by run_operation.
+        jobs (int): Number of operations to run at once.  Operations run in
+            order when jobs is 1.
+        stop_on_error (bool): Set True to skip the remaining operations after
+            the first failure.  Only applies when jobs is 1.
+
+    Returns:
+        List of result dictionaries, in the same order as ops.  Each has keys
+        "op", "ok" and either "result" or "error".
+    """
+    def run(op):
+        if not isinstance(op, dict):
+            return {
+                'op': None, 'ok': False,
+                'error': f'Operation must be a mapping, not {op!r}.',
+            }
+        try:
+            result = run_operation(mngr, op)
+        except Exception as e:
+            return {'op': op.get('op'), 'ok': False, 'error': str(e)}
+        return {'op': op.get('op'), 'ok': True, 'result': result}
+
+    if jobs is None or jobs <= 1:
+        results = []
+        for op in ops:
+            results.append(run(op))
+            if stop_on_error and not results[-1]['ok']:
+                break
+        return results
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(run, ops))
+
+
+def load_plan(text, fmt=None):
+    """ Parses a batch plan into a list of operation dictionaries.
+
+    The plan is a list of operations, or a mapping with the list under an
+    "operations" key.  JSON lines (one operation per line) are also accepted.
+
+    Args:
+        text (str): Plan contents.
+        fmt (str): Optional, "json" or "yaml".  If omitted, tries JSON then
+            JSON lines.  YAML plans require the PyYAML package.
+
+    Returns:
+        List of operation dictionaries.
+    """
+    import json
+
+    if fmt == 'yaml':
+        import yaml
+        plan = yaml.safe_load(text)
+    else:
+        try:
+            plan = json.loads(text)
+        except ValueError:
+            lines = [line for line in text.splitlines() if line.strip()]
+            plan = [json.loads(line) for line in lines]
+
+    if isinstance(plan, dict):
+        plan = plan.get('operations', [])
+    if plan is None:
+        plan = []
+    if not isinstance(plan, list):
+        raise ValueError('Batch plan must be a list of operations.')
+    return plan
+
+
+def _agent_dir():
+    """ Returns a folder only the current user can access, for agent files.
+
+    Uses the local application data folder on Windows.  Elsewhere uses
+    XDG_RUNTIME_DIR if set, otherwise a "localdb-<uid>" folder in the
+    temporary folder, created with mode 0700.
+
+    Raises:
+        LocalDBError if the folder is owned by another user or is accessible
+        to other users.
+    """
+    import os
+    import stat
+    import sys
+    import tempfile
+
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        folder = os.path.join(base, 'localdb')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    uid = os.getuid()
+    runtime = os.environ.get('XDG_RUNTIME_DIR', None)
+    if runtime:
+        folder = os.path.join(runtime, 'localdb')
+    else:
+        folder = os.path.join(tempfile.gettempdir(), f'localdb-{uid}')
+    try:
+        os.mkdir(folder, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(folder)
+    if (not stat.S_ISDIR(info.st_mode) or info.st_uid != uid
+            or info.st_mode & 0o077):
+        raise LocalDBError(
+            f'Agent folder {folder} is not private to this user.',
+            solution='Remove the folder, or set XDG_RUNTIME_DIR.')
+    return folder
+
+
+def default_agent_address():
+    """ Returns the default local address for the LocalDB agent.
+
+    This is a named pipe on Windows and a Unix socket in a private folder
+    elsewhere (see _agent_dir), both specific to the current user.
+    """
+    import getpass
+    import os
+    import sys
+
+    if sys.platform.startswith('win'):
+        user = getpass.getuser()
+        return f'\\\\.\\pipe\\localdb-agent-{user}'
+    return os.path.join(_agent_dir(), 'agent.sock')
+
+
+def agent_authkey(path=None):
+    """ Returns the secret the agent and its clients authenticate with.
+
+    The key is generated on first use and stored in a file only the current
+    user can read.
+
+    Args:
+        path (str): Optional key file path.  Defaults to "agent.key" in the
+            private agent folder.
+    """
+    import os
+    import secrets
+
+    if path is None:
+        path = os.path.join(_agent_dir(), 'agent.key')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            key = f.read()
+        if not key:
+            raise LocalDBError(f'Agent key file {path} is empty.')
+        return key
+    key = secrets.token_hex(32).encode('ascii')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+# Largest agent request or response accepted, in bytes.
+AGENT_MAX_MESSAGE = 64 * 2**20
+
+
+def _agent_send(conn, obj):
+    """ Sends a JSON message over an agent connection.
+    """
+    import json
+    conn.send_bytes(json.dumps(obj, default=str).encode('utf-8'))
+
+
+def _agent_recv(conn):
+    """ Receives a JSON message from an agent connection.
+
+    Messages are JSON, never pickles, so a rogue peer cannot run code.
+    """
+    import json
+    return json.loads(conn.recv_bytes(AGENT_MAX_MESSAGE).decode('utf-8'))
+
+
+class AgentServer(object):
+    """ Serves LocalDB operations to other processes over a local socket.
+
+    The server holds a single InstanceManager (with a shared ConnectionPool),
+    so instance discovery, ODBC driver lookup and database connections are
+    paid for once rather than in every client process.  Requests are
+    operation dictionaries, as accepted by run_operation.
+
+    Uses multiprocessing.connection, so the address is a named pipe on
+    Windows and a Unix socket elsewhere.  Clients must authenticate with the
+    shared authkey, and all messages are JSON.
+    """
+
+    def __init__(self, address=None, manager=None, authkey=None):
+        """ Initialize the server.  Call serve_forever to start serving.
+
+        Args:
+            address (str): Optional socket path or pipe name.  Defaults to
+                default_agent_address().
+            manager (InstanceManager): Optional manager to serve.  If omitted,
+                one is created when the server starts.
+            authkey (bytes): Optional shared secret clients must present.
+                Defaults to agent_authkey().
+        """
+        import threading
+        self.address = address or default_agent_address()
+        self.manager = manager
+        self.authkey = authkey or agent_authkey()
+        self._listener = None
+        self._stopping = threading.Event()
+
+    def serve_forever(self, ready=None):
+        """ Accepts and serves clients until shutdown is requested.
+
+        Each client connection is served on its own thread.
+
+        Args:
+            ready (threading.Event): Optional event, set once the server is
+                listening.
+        """
+        import threading
+        from multiprocessing import AuthenticationError
+        from multiprocessing.connection import Listener
+
+        if self.manager is None:
+            self.manager = InstanceManager(pool=ConnectionPool())
+
+        if not self.address.startswith('\\\\'):
+            self._remove_stale_socket()
+
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if ready is not None:
+            ready.set()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = self._listener.accept()
+                except (AuthenticationError, EOFError, OSError):
+                    if self._stopping.is_set():
+                        break
+                    # A client without the key, or one that hung up during
+                    # the handshake.
+                    continue
+                threading.Thread(
+                    target=self._serve, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+            if self.manager.pool is not None:
+                self.manager.pool.clear()
+
+    def _remove_stale_socket(self):
+        """ Removes a socket left behind by a server that did not shut down.
+
+        Raises:
+            LocalDBError if an agent is still listening at the address, or
+            the address is not a socket.
+        """
+        import os
+        import socket
+        import stat
+
+        try:
+            info = os.lstat(self.address)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(info.st_mode):
+            raise LocalDBError(
+                f'Agent address {self.address} exists and is not a socket.')
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.address)
+        except ConnectionRefusedError:
+            os.unlink(self.address)
+            return
+        finally:
+            probe.close()
+        raise LocalDBError(
+            f'A LocalDB agent is already listening at {self.address}.')
+
+    def shutdown(self):
+        """ Stops the server, from any thread.
+        """
+        from multiprocessing.connection import Client
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        # Wake the listener, which is blocked waiting for a client.
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+
+    def _serve(self, conn):
+        """ Serves requests from one client until it disconnects.
+        """
+        with conn:
+            while True:
+                try:
+                    request = _agent_recv(conn)
+                except (EOFError, OSError):
+                    return
+                except ValueError as e:
+                    _agent_send(conn, {
+                        'ok': False, 'error': f'Bad request: {e}',
+                        'type': type(e).__name__})
+                    continue
+                _agent_send(conn, self.handle(request))
+                if (isinstance(request, dict)
+                        and request.get('op') == 'shutdown'):
+                    return
+
+    def handle(self, request):
+        """ Runs one request and returns the response dictionary.
+        """
+        if not isinstance(request, dict):
+            return {'ok': False, 'error': 'Request must be a JSON object.',
+                    'type': 'ValueError'}
+        op = request.get('op')
+        try:
+            if op == 'ping':
+                result = 'pong'
+            elif op == 'shutdown':
+                self.shutdown()
+                result = None
+            elif op == 'batch':
+                result = run_batch(
+                    self.manager,
+                    request.get('ops', []),
+                    jobs=request.get('jobs', 1),
+                    stop_on_error=request.get('stop_on_error', False),
+                )
+            else:
+                result = run_operation(self.manager, request)
+        except LocalDBError as e:
+            return {'ok': False, 'error': e.short_description,
+                    'type': type(e).__name__, 'description': e.description,
+                    'solution': e.solution}
+        except Exception as e:
+            return {'ok': False, 'error': str(e), 'type': type(e).__name__}
+        return {'ok': True, 'result': result}
+
+
+class AgentClient(object):
+    """ Client for an AgentServer, with the same methods as InstanceManager.
+
+    Results come back as plain data: methods that return InstanceInfo or
+    ServerVersion tuples locally do the same here, but create and get return
+    the InstanceInfo rather than a live Instance object.  Errors in the agent
+    are raised as LocalDBError.
+    """
+
+    def __init__(self, address=None, authkey=None):
+        """ Connects to a running agent.
+
+        Args:
+            address (str): Optional socket path or pipe name.  Defaults to
+                default_agent_address().
+            authkey (bytes): Optional shared secret, as given to the server.
+                Defaults to agent_authkey().
+        """
+        import threading
+        from multiprocessing.connection import Client
+        self.address = address or default_agent_address()
+        self._conn = Client(self.address, authkey=authkey or agent_authkey())
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def call(self, op, **kwargs):
+        """ Sends one operation to the agent and returns its result.
+        """
+        request = dict(kwargs, op=op)
+        with self._lock:
+            _agent_send(self._conn, request)
+            response = _agent_recv(self._conn)
+        if not response['ok']:
+            raise LocalDBError(
+                response['error'],
+                description=response.get('description') or response['error'],
+                solution=response.get('solution', ''))
+        return response['result']
+
+    def ping(self):
+        return self.call('ping')
+
+    def shutdown(self):
+        """ Asks the agent to stop serving.
+        """
+        self.call('shutdown')
+
+    def batch(self, ops, jobs=1, stop_on_error=False):
+        """ Runs many operations in the agent with one round trip.
+
+        See run_batch for the arguments and results.
+        """
+        return self.call(
+            'batch', ops=ops, jobs=jobs, stop_on_error=stop_on_error)
+
+    def get(self, name, create=False):
+        for found in self.info():
+            if found.lower() == name.lower():
+                return self.info(found)
+        if create:
+            return self.create(name)
+        return None
+
+    def create(self, name, version='', start=False):
+        info = self.call('create', name=name, version=version, start=start)
+        return InstanceInfo.from_dict(info)
+
+    def delete(self, name):
+        self.call('delete', name=name)
+
+    def start(self, name):
+        self.call('start', name=name)
+
+    def stop(self, name):
+        self.call('stop', name=name)
+
+    def share(self, name, sharedname, owner=None):
+        self.call('share', name=name, sharedname=sharedname, owner=owner)
+
+    def unshare(self, sharedname):
+        self.call('unshare', sharedname=sharedname)
+
+    def info(self, name=''):
+        result = self.call('info', name=name)
+        if name:
+            return InstanceInfo.from_dict(result)
+        return result
+
+    def versions(self):
+        return [ServerVersion.from_dict(v) for v in self.call('versions')]
+
+    def trace(self, enable=True):
+        self.call('trace', enable=enable)
+
+    def connection_string(self, name, dbname=None):
+        return self.call('connstring', name=name, dbname=dbname)
+
+    def url(self, name, dbname):
+        return self.call('url', name=name, dbname=dbname)
+
+    def attach(self, name, filepath, dbname=None):
+        return self.call(
+            'attach', name=name, filepath=filepath, dbname=dbname)
+
+    def detach(self, name, dbname):
+        self.call('detach', name=name, dbname=dbname)
+
+
+class FakeODBC(object):
+    """ Stand-in for pyodbc.connect with simulated latency, for run_load.
+
+    Statements return a single row (1,).  Instances can be pickled, so this
+    also works with run_load's process mode.
+    """
+
+    def __init__(self, latency=0.001, jitter=0.0, error_rate=0.0):
+        """ Initialize the fake backend.
+
+        Args:
+            latency (float): Seconds each statement takes.
+            jitter (float): Extra random seconds, up to this much.
+            error_rate (float): Fraction of statements that raise an error.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def __call__(self, dsn, autocommit=True):
+        return _FakeODBCConnection(self)
+
+
+class _FakeODBCConnection(object):
+
+    def __init__(self, backend):
+        import random
+        self.backend = backend
+        self._random = random.Random()
+
+    def execute(self, sql, *params):
+        import time
+        backend = self.backend
+        time.sleep(backend.latency + self._random.random() * backend.jitter)
+        if self._random.random() < backend.error_rate:
+            raise RuntimeError('Simulated failure.')
+        return _CassetteCursor([{'columns': ['value'], 'rows': [[1]]}])
+
+    def close(self):
+        pass
+
+
+def _load_client(dsn, statements, weights, duration, connect, seed):
+    """ Connects, then runs statements on the connection for the duration.
+
+    The clock starts once connected, so pool and connection start-up are not
+    counted.
+
+    Returns:
+        Tuple of (list of latencies in seconds, error count, seconds run).
+    """
+    import random
+    import time
+
+    if connect is None:
+        import pyodbc
+        connect = pyodbc.connect
+    rand = random.Random(seed)
+    latencies = []
+    errors = 0
+    conn = connect(dsn, autocommit=True)
+    began = time.perf_counter()
+    deadline = began + duration
+    try:
+        while time.perf_counter() < deadline:
+            sql = rand.choices(statements, weights)[0]
+            start = time.perf_counter()
+            try:
+                cursor = conn.execute(sql)
+                if cursor is not None and cursor.description:
+                    cursor.fetchall()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        elapsed = time.perf_counter() - began
+        conn.close()
+    return latencies, errors, elapsed
+
+
+def _load_client_args(args):
+    return _load_client(*args)
+
+
+def run_load(target, statements=('SELECT 1',), clients=4, duration=10.0,
+             mode='thread', dbname=None, connect=None, seed=None):
+    """ Runs concurrent clients against an instance and measures throughput.
+
+    Each client holds its own connection and runs statements back to back,
+    picking from the mix at random, for the duration after it connects.
+    Requests per second is the sum of the clients' rates over their own
+    measured windows, so starting the clients is not counted.
+
+    Args:
+        target (Instance or str): Instance to load, or a connection string.
+        statements (list): SQL strings, or (weight, sql) tuples to set the mix
+            of e.g. reads and writes.  Equal weights if not given.
+        clients (int): Number of concurrent clients.
+        duration (float): Seconds to run for.
+        mode (str): "thread" or "process".  Use processes to take the Python
+            client overhead out of the measurement.
+        dbname (str): Optional database, when target is an Instance.
+        connect (callable): Optional connection factory, e.g. FakeODBC().
+            Defaults to pyodbc.connect.  Must be picklable in process mode.
+        seed (int): Optional random seed for reproducible statement mixes.
+
+    Returns:
+        LoadReport with request and error counts, requests per second and
+        latency statistics in seconds.
+    """
+    import random
+
+    if isinstance(target, Instance):
+        dsn = target.connection_string(dbname)
+    else:
+        dsn = target
+
+    sqls, weights = [], []
+    for stmt in statements:
+        if isinstance(stmt, str):
+            weight, stmt = 1, stmt
+        else:
+            weight, stmt = stmt
+        weights.append(weight)
+        sqls.append(stmt)
+
+    seeds = random.Random(seed).sample(range(2**31), clients)
+    args = [(dsn, sqls, weights, duration, connect, s) for s in seeds]
+
+    if mode == 'thread':
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(_load_client_args, args))
+    elif mode == 'process':
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(_load_client_args, args))
+    else:
+        raise ValueError(f'Unknown load mode "{mode}".')
+
+    latencies = sorted(t for ts, _, _ in results for t in ts)
+    errors = sum(e for _, e, _ in results)
+    elapsed = max((t for _, _, t in results), default=0.0)
+    qps = sum(len(ts) / t for ts, _, t in results if t > 0)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        index = max(int(round(p / 100 * len(latencies))) - 1, 0)
+        return latencies[index]
+
+    count = len(latencies)
+    return LoadReport(
+        clients=clients,
+        duration=elapsed,
+        requests=count,
+        errors=errors,
+        qps=qps,
+        mean=sum(latencies) / count if count else None,
+        p50=percentile(50),
+        p90=percentile(90),
+        p99=percentile(99),
+        max=latencies[-1] if latencies else None,
+    )
+
+
+def _build_parser():
+    """ Builds the argparse parser for the command line interface.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m localdb',
+        description='Manage SQL Server LocalDB instances.',
+    )
+    parser.add_argument(
+        '--json', action='store_true', help='Print results as JSON.')
+    parser.add_argument(
+        '--agent', action='store_true',
+        help='Send commands to a running agent instead of running them here.')
+    parser.add_argument(
+        '--agent-address', default=None, metavar='ADDRESS',
+        help='Socket path or pipe name of the agent.  Implies --agent.')
+    sub = parser.add_subparsers(dest='op', metavar='command')
+    sub.required = True
+
+    p = sub.add_parser('create', help='Create an instance.')
+    p.add_argument('name')
+    p.add_argument('version', nargs='?', default='')
+    p.add_argument('-s', '--start', action='store_true')
+
+    for cmd in ('delete', 'start', 'stop'):
+        p = sub.add_parser(cmd, help=f'{cmd.capitalize()} an instance.')
+        p.add_argument('name')
+
+    p = sub.add_parser('share', help='Share an instance.')
+    p.add_argument('name')
+    p.add_argument('sharedname')
+    p.add_argument('owner', nargs='?', default=None)
+
+    p = sub.add_parser('unshare', help='Stop sharing an instance.')
+    p.add_argument('sharedname')
+
+    p = sub.add_parser('info', help='List instances or describe one.')
+    p.add_argument('name', nargs='?', default='')
+
+    sub.add_parser('versions', help='List installed LocalDB versions.')
+
+    p = sub.add_parser('trace', help='Turn tracing on or off.')
+    p.add_argument('enable', choices=['on', 'off'])
+
+    for cmd in ('connstring', 'url'):
+        p = sub.add_parser(cmd, help='Print an instance database address.')
+        p.add_argument('name')
+        p.add_argument('dbname', nargs='?', default=None)
+
+    p = sub.add_parser('attach', help='Attach a MDF file to an instance.')
+    p.add_argument('name')
+    p.add_argument('filepath')
+    p.add_argument('dbname', nargs='?', default=None)
+
+    p = sub.add_parser('detach', help='Detach a database from an instance.')
+    p.add_argument('name')
+    p.add_argument('dbname')
+
+    p = sub.add_parser('backup', help='Back up a database to files.')
+    p.add_argument('name')
+    p.add_argument('dbname')
+    p.add_argument('path')
+    p.add_argument('-s', '--stripes', type=int, default=1)
+    p.add_argument('--verify', action='store_true')
+
+    p = sub.add_parser('restore', help='Restore a database from files.')
+    p.add_argument('name')
+    p.add_argument('path')
+    p.add_argument('dbname')
+    p.add_argument('--replace', action='store_true')
+    p.add_argument('--move-to', dest='move_to', default=None)
+
+    p = sub.add_parser('wait', help='Wait until an instance is ready.')
+    p.add_argument('name')
+    p.add_argument('-t', '--timeout', type=float, default=30.0)
+
+    p = sub.add_parser('batch', help='Run a plan of many operations.')
+    p.add_argument(
+        'plan', nargs='?', default='-',
+        help='JSON or YAML plan file.  Reads stdin if omitted or "-".')
+    p.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of operations to run concurrently.')
+    p.add_argument(
+        '--stop-on-error', action='store_true',
+        help='Skip remaining operations after a failure (sequential only).')
+    p.add_argument('--format', choices=['json', 'yaml'], default=None)
+
+    p = sub.add_parser('loadtest', help='Measure throughput and latency.')
+    p.add_argument('name')
+    p.add_argument('dbname', nargs='?', default=None)
+    p.add_argument(
+        '--sql', action='append', default=None,
+        help='Statement to run, repeat for a mix.  Prefix with "WEIGHT:" to '
+             'weight it, e.g. "3:SELECT 1".  Defaults to SELECT 1.')
+    p.add_argument('-c', '--clients', type=int, default=4)
+    p.add_argument('-d', '--duration', type=float, default=10.0)
+    p.add_argument('--mode', choices=['thread', 'process'], default='thread')
+    p.add_argument(
+        '--fake-latency', type=float, default=None, metavar='SECONDS',
+        help='Use a simulated backend instead of the instance.')
+
+    p = sub.add_parser('agent', help='Serve operations to other processes.')
+    p.add_argument(
+        'address', nargs='?', default=None,
+        help='Socket path or pipe name.  Defaults to a per-user address.')
+
+    return parser
+
+
+def main(argv=None):
+    """ Command line entry point, run as "python -m localdb".
+
+    Args:
+        argv (list of str): Optional command line arguments.  Defaults to
+            sys.argv.
+
+    Returns:
+        Process exit code.
+    """
+    import json
+    import sys
+
+    args = vars(_build_parser().parse_args(argv))
+    as_json = args.pop('json')
+    address = args.pop('agent_address')
+    agent = args.pop('agent') or address is not None
+    cmd = args['op']
+
+    def fail(e, prefix=''):
+        if as_json:
+            print(json.dumps({'op': cmd, 'ok': False, 'error': str(e)}))
+        else:
+            print(f'Error: {prefix}{e}', file=sys.stderr)
+        return 1
+
+    if cmd == 'agent':
+        AgentServer(args['address']).serve_forever()
+        return 0
+
+    if cmd == 'loadtest':
+        statements = []
+        for sql in args['sql'] or ['SELECT 1']:
+            weight, sep, rest = sql.partition(':')
+            if sep and weight.strip().isdigit():
+                statements.append((int(weight), rest))
+            else:
+                statements.append(sql)
+        if args['fake_latency'] is not None:
+            target = args['name']
+            connect = FakeODBC(args['fake_latency'])
+        else:
+            try:
+                target = InstanceManager().get(args['name'])
+            except Exception as e:
+                return fail(e)
+            if target is None:
+                print(f'Error: no instance "{args["name"]}"', file=sys.stderr)
+                return 1
+            connect = None
+        report = run_load(
+            target, statements, clients=args['clients'],
+            duration=args['duration'], mode=args['mode'],
+            dbname=args['dbname'], connect=connect)
+        if as_json:
+            print(json.dumps(_jsonable(report), indent=2))
+        else:
+            for key, value in report._asdict().items():
+                if key in ('mean', 'p50', 'p90', 'p99', 'max'):
+                    value = 'n/a' if value is None else f'{value * 1000:.3f} ms'
+                elif key in ('duration', 'qps'):
+                    value = f'{value:.2f}'
+                print(f'{key}: {value}')
+        return 0 if report.requests else 1
+
+    if cmd == 'batch':
+        path = args['plan']
+        fmt = args['format']
+        try:
+            if path == '-':
+                text = sys.stdin.read()
+            else:
+                if fmt is None and path.lower().endswith(('.yml', '.yaml')):
+                    fmt = 'yaml'
+                with open(path) as f:
+                    text = f.read()
+            ops = load_plan(text, fmt=fmt)
+        except Exception as e:
+            return fail(e, prefix='cannot read batch plan: ')
+
+    if cmd == 'trace':
+        args['enable'] = args['enable'] == 'on'
+
+    try:
+        if agent:
+            with AgentClient(address) as client:
+                if cmd == 'batch':
+                    results = client.batch(
+                        ops, jobs=args['jobs'],
+                        stop_on_error=args['stop_on_error'])
+                else:
+                    op = dict(args)
+                    result = client.call(op.pop('op'), **op)
+        else:
+            mngr = InstanceManager()
+            if cmd == 'batch':
+                results = run_batch(
+                    mngr, ops, jobs=args['jobs'],
+                    stop_on_error=args['stop_on_error'])
+            else:
+                result = run_operation(mngr, args)
+    except Exception as e:
+        return fail(e)
+
+    if cmd == 'batch':
+        if as_json:
+            print(json.dumps(results, indent=2))
+        else:
+            for res in results:
+                status = 'ok' if res['ok'] else 'FAILED'
+                detail = res.get('result', res.get('error'))
+                print(f'{res["op"]}: {status}' +
+                      ('' if detail is None else f': {detail}'))
+        return 0 if all(res['ok'] for res in results) else 1
+
+    if as_json:
+        print(json.dumps(result, indent=2))
+    elif isinstance(result, list):
+        for item in result:
+            print(item)
+    elif isinstance(result, dict):
+        for key, value in result.items():
+            print(f'{key}: {value}')
+    elif result is not None:
+        print(result)
+    return 0
+
+
 if __name__ == '__main__':
-    mngr = InstanceManager()
-    inst = mngr.get('Qraken')
-    print(inst.connection_string('mydatabase'))
+    import sys
+    sys.exit(main())
@@ -61,3 +61,1019 @@ class InstanceTestCase(ut.TestCase):
             r'Trusted_Connection=yes'
         )
         self.assertEqual(cstr, expected)
+
+
+class FakeExecutor(object):
+    """ Stands in for CmdExecutor, simulating SQLLocalDB.exe in memory.
+    """
+
+    INFO = (
+        'Name:               {name}\n'
+        'Version:            13.1.4001.0\n'
+        'Shared name:        {shared}\n'
+        'Owner:              HOST\\user\n'
+        'Auto-create:        No\n'
+        'State:              {state}\n'
+        'Last start time:    10/19/2026 9:15:02 AM\n'
+        'Instance pipe name: {pipe}\n'
+    )
+
+    def __init__(self):
+        self.instances = {}
+        self.calls = []
+
+    def call(self, cmd, **kwargs):
+        self.calls.append((cmd, kwargs))
+        name = kwargs.get('name', '')
+        if cmd == 'create':
+            state = 'Running' if kwargs.get('start') else 'Stopped'
+            self.instances[name] = {'state': state, 'shared': ''}
+        elif cmd == 'delete':
+            self.instances.pop(name, None)
+        elif cmd in ('start', 'stop'):
+            state = 'Running' if cmd == 'start' else 'Stopped'
+            self.instances[name]['state'] = state
+        elif cmd == 'share':
+            self.instances[name]['shared'] = kwargs['sharedname']
+        elif cmd == 'info':
+            if not name:
+                return ''.join(n + '\n' for n in self.instances)
+            inst = self.instances[name]
+            pipe = ''
+            if inst['state'] == 'Running':
+                pipe = f'np:\\\\.\\pipe\\LOCALDB#{name}\\tsql\\query'
+            return self.INFO.format(name=name, pipe=pipe, **inst)
+        elif cmd == 'versions':
+            return (
+                'Microsoft SQL Server 2014 (12.0.2000.8)\n'
+                'Microsoft SQL Server 2016 (13.1.4001.0)\n'
+            )
+        return ''
+
+
+class FakeExecutorTestCase(ut.TestCase):
+    """ Base class for tests that run against a simulated SQLLocalDB.exe.
+    """
+
+    def setUp(self):
+        self.fake = FakeExecutor()
+        patcher = mock.patch.object(localdb, 'CmdExecutor', lambda: self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mngr = localdb.InstanceManager()
+
+
+class BatchTestCase(FakeExecutorTestCase):
+
+    def test_load_plan(self):
+        """ Reads JSON, JSON lines and YAML plans.
+        """
+        expected = [{'op': 'create', 'name': 'A'}, {'op': 'start', 'name': 'A'}]
+        self.assertEqual(localdb.load_plan(
+            '{"operations": [{"op": "create", "name": "A"},'
+            ' {"op": "start", "name": "A"}]}'), expected)
+        self.assertEqual(localdb.load_plan(
+            '{"op": "create", "name": "A"}\n\n{"op": "start", "name": "A"}\n'),
+            expected)
+        self.assertEqual(localdb.load_plan(
+            '- {op: create, name: A}\n- {op: start, name: A}\n', fmt='yaml'),
+            expected)
+
+    def test_run_batch(self):
+        """ Runs many operations in order, reporting failures per operation.
+        """
+        ops = [
+            {'op': 'create', 'name': 'A', 'start': True},
+            {'op': 'info', 'name': 'A'},
+            {'op': 'bogus'},
+            {'op': 'info'},
+        ]
+        results = localdb.run_batch(self.mngr, ops)
+        self.assertEqual([r['ok'] for r in results], [True, True, False, True])
+        self.assertEqual(results[1]['result']['state'], 'Running')
+        self.assertEqual(results[3]['result'], ['A'])
+
+    def test_run_batch_concurrent(self):
+        """ Runs operations concurrently, keeping results in plan order.
+        """
+        ops = [{'op': 'create', 'name': f'I{i}'} for i in range(8)]
+        results = localdb.run_batch(self.mngr, ops, jobs=4)
+        self.assertTrue(all(r['ok'] for r in results))
+        self.assertEqual(
+            [r['result']['name'] for r in results], [f'I{i}' for i in range(8)])
+
+    def test_run_batch_bad_entries(self):
+        """ Reports entries that are not operations without losing the rest.
+        """
+        ops = [{'op': 'create', 'name': 'B'}, 'x', {'op': 'info'}]
+        results = localdb.run_batch(self.mngr, ops)
+        self.assertEqual([r['ok'] for r in results], [True, False, True])
+        self.assertEqual(results[2]['result'], ['B'])
+
+    def test_main_bad_plan(self):
+        """ Exits 1 with a message for missing or unreadable plans.
+        """
+        import io
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as err:
+            code = localdb.main(['batch', '/no/such/plan.json'])
+        self.assertEqual(code, 1)
+        self.assertIn('cannot read batch plan', err.getvalue())
+        with mock.patch('sys.stdin', io.StringIO('{not json')), \
+                mock.patch('sys.stderr', new_callable=io.StringIO):
+            self.assertEqual(localdb.main(['batch']), 1)
+
+    def test_main_batch_stdin(self):
+        """ Reads a batch plan from stdin and prints JSON results.
+        """
+        import io
+        import json
+        plan = json.dumps([{'op': 'create', 'name': 'A'}, {'op': 'versions'}])
+        with mock.patch('sys.stdin', io.StringIO(plan)), \
+                mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            code = localdb.main(['--json', 'batch'])
+        self.assertEqual(code, 0)
+        results = json.loads(out.getvalue())
+        self.assertEqual(results[1]['result'][1]['major'], 13)
+
+
+class ConnectionPoolTestCase(ut.TestCase):
+
+    def test_reuse(self):
+        """ Reuses released connections and discards failed ones.
+        """
+        connect = mock.Mock(side_effect=lambda dsn, autocommit: mock.Mock())
+        pool = localdb.ConnectionPool(maxidle=1, connect=connect)
+        with pool.connection('dsn') as first:
+            pass
+        with pool.connection('dsn') as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(connect.call_count, 1)
+
+        with self.assertRaises(ValueError):
+            with pool.connection('dsn') as conn:
+                raise ValueError()
+        conn.close.assert_called_once_with()
+        pool.clear()
+
+
+class AgentTestCase(FakeExecutorTestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        import threading
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        patcher = mock.patch.dict(
+            'os.environ', {'XDG_RUNTIME_DIR': self.tmpdir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = localdb.AgentServer(manager=self.mngr)
+        ready = threading.Event()
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait(5)
+        self.client = localdb.AgentClient()
+
+    def tearDown(self):
+        self.client.shutdown()
+        self.client.close()
+        self.thread.join(5)
+
+    def test_private_files(self):
+        """ Keeps the socket and key in a private folder, and the key secret.
+        """
+        import os
+        import stat
+        folder = os.path.join(self.tmpdir, 'localdb')
+        self.assertEqual(
+            self.server.address, os.path.join(folder, 'agent.sock'))
+        self.assertEqual(stat.S_IMODE(os.stat(folder).st_mode), 0o700)
+        keyfile = os.path.join(folder, 'agent.key')
+        self.assertEqual(stat.S_IMODE(os.stat(keyfile).st_mode), 0o600)
+        self.assertEqual(localdb.agent_authkey(), self.server.authkey)
+
+        os.chmod(folder, 0o755)
+        with self.assertRaises(localdb.LocalDBError):
+            localdb.default_agent_address()
+        os.chmod(folder, 0o700)
+
+    def test_authentication(self):
+        """ Rejects clients without the key and keeps serving the others.
+        """
+        from multiprocessing import AuthenticationError
+        with self.assertRaises(AuthenticationError):
+            localdb.AgentClient(authkey=b'wrong')
+        self.assertEqual(self.client.ping(), 'pong')
+
+    def test_live_address(self):
+        """ Refuses to replace the socket of a running agent.
+        """
+        other = localdb.AgentServer(self.server.address, manager=self.mngr)
+        with self.assertRaises(localdb.LocalDBError):
+            other.serve_forever()
+        self.assertEqual(self.client.ping(), 'pong')
+
+    def test_operations(self):
+        """ Runs operations in the agent process through the client API.
+        """
+        self.assertEqual(self.client.ping(), 'pong')
+        info = self.client.create('A', start=True)
+        self.assertEqual(info.state, 'Running')
+        self.assertEqual(self.client.info(), ['A'])
+        self.assertEqual(self.client.get('a').name, 'A')
+        self.client.stop('A')
+        self.assertEqual(self.client.info('A').state, 'Stopped')
+        self.assertEqual(len(self.client.versions()), 2)
+
+    def test_errors_and_batch(self):
+        """ Raises agent errors locally and runs batches in one round trip.
+        """
+        with self.assertRaises(localdb.LocalDBError):
+            self.client.connection_string('Missing')
+        results = self.client.batch(
+            [{'op': 'create', 'name': 'A'}, {'op': 'delete', 'name': 'A'}])
+        self.assertTrue(all(r['ok'] for r in results))
+        self.assertEqual(self.fake.instances, {})
+
+    def test_main(self):
+        """ Sends command line operations to the agent.
+        """
+        import io
+        self.client.create('A')
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            self.assertEqual(localdb.main(['--agent', 'info']), 0)
+        self.assertEqual(out.getvalue(), 'A\n')
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as err:
+            code = localdb.main(
+                ['--agent-address', self.server.address + '.none', 'info'])
+        self.assertEqual(code, 1)
+        self.assertTrue(err.getvalue().startswith('Error: '))
+
+    def test_bad_request(self):
+        """ Answers a request that is not an object and keeps the connection.
+        """
+        self.client._conn.send_bytes(b'[1, 2]')
+        response = localdb._agent_recv(self.client._conn)
+        self.assertFalse(response['ok'])
+        self.assertEqual(self.client.ping(), 'pong')
+
+    def test_error_details(self):
+        """ Raises agent errors with the agent's text as their description.
+        """
+        with self.assertRaises(localdb.LocalDBError) as ctx:
+            self.client.connection_string('Missing')
+        self.assertEqual(
+            ctx.exception.short_description,
+            'LocalDB instance "Missing" does not exist.')
+        self.assertIn('"Missing" does not exist', ctx.exception.summary)
+        self.assertNotIn('LocalDBError', ctx.exception.summary)
+
+
+class LockTestCase(ut.TestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.lockdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lockdir)
+
+    def test_exclusive(self):
+        """ Excludes other lock holders until released, but is re-entrant.
+        """
+        path = localdb.lock_path('Test Instance', self.lockdir)
+        first = localdb.FileLock(path)
+        other = localdb.FileLock(path, timeout=0.1)
+        with first:
+            with first:
+                pass
+            with self.assertRaises(localdb.LocalDBError):
+                other.acquire()
+        with other:
+            pass
+
+    def test_manager_locks(self):
+        """ Shares one lock per instance name, whatever the case.
+        """
+        fake = FakeExecutor()
+        with mock.patch.object(localdb, 'CmdExecutor', lambda: fake):
+            mngr = localdb.InstanceManager(lockdir=self.lockdir)
+            inst = mngr.create('Test')
+            self.assertIs(mngr.lock('TEST'), inst._lock)
+            with mngr.lock('test'):
+                inst.reset()
+                mngr.delete('Test')
+
+    def test_shard_name(self):
+        """ Maps worker IDs to names deterministically.
+        """
+        with mock.patch.dict('os.environ', {'PYTEST_XDIST_WORKER': 'gw3'}):
+            self.assertEqual(localdb.shard_name('Test'), 'Test_gw3')
+            self.assertEqual(localdb.shard_name('Test', shards=2), 'Test_1')
+        self.assertEqual(localdb.shard_name('Test', worker='master'), 'Test')
+        name = localdb.shard_name('Test', worker='alpha', shards=4)
+        self.assertEqual(name, localdb.shard_name('Test', 'alpha', 4))
+        self.assertIn(name, [f'Test_{i}' for i in range(4)])
+
+
+class FakeCursor(object):
+    """ Minimal pyodbc cursor with a single result set.
+    """
+
+    def __init__(self, rows=None):
+        self.description = [('value',)] if rows is not None else None
+        self.rows = rows or []
+
+    def fetchall(self):
+        return self.rows
+
+    def nextset(self):
+        return False
+
+
+class CassetteTestCase(ut.TestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.path = tmpdir + '/tape.json.gz'
+
+    def record(self):
+        """ Records a session against the fake executor and connection.
+        """
+        fake = FakeExecutor()
+        conn = mock.Mock()
+        conn.execute.return_value = FakeCursor([(1,)])
+        tape = localdb.Cassette(
+            self.path, mode='record', executor=fake,
+            connect=lambda dsn, autocommit: conn)
+        with mock.patch.object(localdb.Instance, '_driver', 'ODBC Driver'):
+            with tape:
+                mngr = tape.manager()
+                inst = mngr.create('Test', start=True)
+                inst.attach('/data/test.mdf')
+                with inst.connect() as c:
+                    value = c.execute('SELECT 1').fetchval()
+                mngr.stop('Test')
+                mngr.info('Test')
+        self.assertEqual(value, 1)
+        return fake
+
+    def test_replay(self):
+        """ Replays a recorded session without LocalDB or pyodbc.
+        """
+        fake = self.record()
+        with localdb.Cassette(self.path) as tape:
+            mngr = tape.manager()
+            inst = mngr.create('Test', start=True)
+            self.assertEqual(inst.info().state, 'Running')
+            self.assertEqual(inst.attach('/data/test.mdf'), 'test')
+            with inst.connect() as c:
+                self.assertEqual(c.execute('SELECT 1').fetchall(), [(1,)])
+            mngr.stop('Test')
+            self.assertEqual(mngr.info('Test').state, 'Stopped')
+            with self.assertRaises(localdb.LocalDBError):
+                mngr.start('Other')
+        self.assertEqual(len(tape.calls), len(fake.calls))
+        self.assertIsNone(localdb.Instance._driver)
+
+    def test_replay_params_and_errors(self):
+        """ Matches SQL on its parameters and translates replayed ODBC errors.
+        """
+        class ProgrammingError(Exception):
+            pass
+        ProgrammingError.__module__ = 'pyodbc'
+
+        def execute(sql, *params):
+            if sql.strip().startswith('CREATE DATABASE'):
+                raise ProgrammingError('42000', (
+                    '[42000] [Microsoft][ODBC Driver 17 for SQL Server]'
+                    '[SQL Server]Unable to open the physical file. (5120) '
+                    '(SQLExecDirectW)'))
+            return FakeCursor([(params[0] * 10,)])
+
+        conn = mock.Mock()
+        conn.execute.side_effect = execute
+        with mock.patch.object(localdb.Instance, '_driver', 'ODBC Driver'):
+            with localdb.Cassette(
+                    self.path, mode='record', executor=FakeExecutor(),
+                    connect=lambda dsn, autocommit: conn) as tape:
+                inst = tape.manager().create('Test', start=True)
+                with inst.connect() as c:
+                    c.execute('SELECT ?', 1)
+                    c.execute('SELECT ?', 2)
+                with self.assertRaises(localdb.LocalDBError) as live:
+                    inst.attach('/data/test.mdf')
+
+        with localdb.Cassette(self.path) as tape:
+            inst = tape.manager().create('Test', start=True)
+            with inst.connect() as c:
+                self.assertEqual(c.execute('SELECT ?', 2).fetchval(), 20)
+                self.assertEqual(c.execute('SELECT ?', 1).fetchval(), 10)
+            with self.assertRaises(localdb.LocalDBError) as replayed:
+                inst.attach('/data/test.mdf')
+        self.assertEqual(
+            replayed.exception.short_description,
+            live.exception.short_description)
+        self.assertEqual(
+            replayed.exception.solution, live.exception.solution)
+        self.assertIn('NOT attachable', replayed.exception.solution)
+
+    def test_replay_latency(self):
+        """ Optionally sleeps for the (scaled) recorded durations.
+        """
+        self.record()
+        with mock.patch('time.sleep') as sleep:
+            with localdb.Cassette(self.path, latency=2.0) as tape:
+                tape.manager()
+        expected = tape.calls[0]['elapsed'] * 2.0
+        self.assertAlmostEqual(sleep.call_args_list[0][0][0], expected)
+
+
+class ReadinessTestCase(FakeExecutorTestCase):
+
+    def test_wait_until_ready(self):
+        """ Returns as soon as a started instance is ready, or on timeout.
+        """
+        inst = self.mngr.create('Test')
+        self.assertFalse(inst.wait_until_ready(timeout=0.05))
+        inst.start()
+        self.assertTrue(inst.wait_until_ready(timeout=0))
+        self.assertEqual(inst.info().state, 'Running')
+
+    def test_backoff(self):
+        """ Probes with exponentially increasing, capped intervals.
+        """
+        inst = self.mngr.create('Test')
+        probes = [False] * 5 + [True]
+        with mock.patch.object(inst, 'is_ready', side_effect=probes), \
+                mock.patch('time.sleep') as sleep:
+            self.assertTrue(inst.wait_until_ready(
+                timeout=60, interval=0.1, max_interval=0.5))
+        delays = [c[0][0] for c in sleep.call_args_list]
+        self.assertEqual(delays, [0.1, 0.2, 0.4, 0.5, 0.5])
+
+    def test_wait_command(self):
+        """ Exits non-zero when the wait times out.
+        """
+        import io
+        self.mngr.create('Test')
+        with mock.patch.object(localdb, 'InstanceManager', lambda: self.mngr):
+            with mock.patch('sys.stderr', new_callable=io.StringIO):
+                code = localdb.main(['wait', 'Test', '-t', '0.05'])
+            self.assertEqual(code, 1)
+            self.mngr.start('Test')
+            with mock.patch('sys.stdout', new_callable=io.StringIO):
+                self.assertEqual(localdb.main(['wait', 'Test', '-t', '0']), 0)
+
+    def test_wait_all(self):
+        """ Waits for several instances at once, reporting each result.
+        """
+        self.mngr.create('A', start=True)
+        self.mngr.create('B')
+        result = self.mngr.wait_all(timeout=0.05)
+        self.assertEqual(result, {'A': True, 'B': False})
+
+
+class PooledTestCase(FakeExecutorTestCase):
+    """ Base class for tests that also use a pool of mock connections.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(localdb.Instance, '_driver', 'Driver')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.conn = mock.Mock()
+        self.conn.execute.return_value = FakeCursor([(1,)])
+        self.mngr.pool = localdb.ConnectionPool(
+            connect=lambda dsn, autocommit: self.conn)
+
+
+class AutostartTestCase(PooledTestCase):
+
+    def starts(self):
+        return [c for c in self.fake.calls if c[0] == 'start']
+
+    def test_autostart(self):
+        """ Starts and warms up a stopped instance on first use only.
+        """
+        self.mngr.autostart = True
+        self.mngr.warmup = ['SELECT 1', ('mydb', 'SELECT * FROM t')]
+        inst = self.mngr.create('Test')
+        cstr = inst.connection_string('mydb')
+        self.assertIn('Database={mydb}', cstr)
+        self.assertEqual(len(self.starts()), 1)
+        self.assertEqual(
+            [c[0][0] for c in self.conn.execute.call_args_list],
+            ['SELECT 1', 'SELECT * FROM t'])
+        inst.connection_string('mydb')
+        self.assertEqual(len(self.starts()), 1)
+
+    def test_no_autostart(self):
+        """ Leaves stopped instances alone unless asked.
+        """
+        inst = self.mngr.create('Test')
+        inst.connection_string()
+        self.assertEqual(self.starts(), [])
+        inst.connection_string(autostart=True)
+        self.assertEqual(len(self.starts()), 1)
+
+    def test_keepalive(self):
+        """ Pings hot instances, restarting any that stopped.
+        """
+        self.mngr.create('Test')
+        keepalive = localdb.KeepAlive()
+        keepalive.add(self.mngr.get('Test'))
+        keepalive.ping_all()
+        self.assertEqual(len(self.starts()), 1)
+        self.assertEqual(keepalive.errors, {})
+        self.conn.execute.side_effect = RuntimeError('down')
+        keepalive.ping_all()
+        self.assertIn('test', keepalive.errors)
+
+
+class ResourcesTestCase(PooledTestCase):
+
+    def executed(self):
+        return [c[0][0] for c in self.conn.execute.call_args_list]
+
+    def test_configure_resources(self):
+        """ Applies changed settings only, and reapplies all after reset.
+        """
+        inst = self.mngr.create('Test', start=True)
+        inst.configure_resources(max_server_memory_mb=512, max_dop=1)
+        sql = self.executed()[-1]
+        self.assertIn("N'max server memory (MB)', 512;", sql)
+        self.assertIn("N'max degree of parallelism', 1;", sql)
+
+        inst.configure_resources(max_server_memory_mb=512)
+        self.assertEqual(len(self.executed()), 1)
+        with self.assertRaises(ValueError):
+            inst.configure_resources(max_memory=1)
+
+        inst.reset()
+        self.assertEqual(len(self.executed()), 2)
+        self.assertIn("N'max degree of parallelism', 1;", self.executed()[-1])
+
+    def test_configure_errors(self):
+        """ Does not record settings rejected by a later statement.
+        """
+        inst = self.mngr.create('Test', start=True)
+        cursor = FakeCursor()
+        cursor.nextset = mock.Mock(side_effect=RuntimeError('rejected'))
+        self.conn.execute.return_value = cursor
+        with self.assertRaises(RuntimeError):
+            inst.configure_resources(max_dop=1)
+        self.assertEqual(inst.resources, {})
+
+    def test_reset_not_ready(self):
+        """ Raises if the instance is not ready for its settings after reset.
+        """
+        inst = self.mngr.create('Test', start=True)
+        inst.configure_resources(max_dop=1)
+        with mock.patch.object(inst, 'wait_until_ready', return_value=False):
+            with self.assertRaises(localdb.LocalDBError):
+                inst.reset()
+        self.assertEqual(len(self.conn.execute.call_args_list), 1)
+
+    def test_memory_budget(self):
+        """ Divides the budget between running instances as they start.
+        """
+        memory = 'max server memory (MB)'
+        self.mngr.create('A', start=True)
+        self.mngr.create('B')
+        self.assertEqual(self.mngr.set_memory_budget(3000), {'A': 3000})
+        self.mngr.start('B')
+        self.assertEqual(self.mngr.get('A').resources, {memory: 1500})
+
+        # LocalDB stops idle instances behind the manager's back.
+        self.fake.instances['A']['state'] = 'Stopped'
+        self.mngr.create('C').ensure_started()
+        self.assertEqual(self.mngr.get('C').resources, {memory: 1500})
+        self.assertEqual(
+            self.mngr.apply_memory_budget(), {'B': 1500, 'C': 1500})
+
+        with self.assertRaises(localdb.LocalDBError):
+            self.mngr.set_memory_budget(200)
+        self.assertEqual(self.mngr.get('B').resources, {memory: 1500})
+
+
+class WatcherTestCase(FakeExecutorTestCase):
+
+    def test_events(self):
+        """ Emits typed events for changes between polls.
+        """
+        self.mngr.create('A')
+        watcher = localdb.InstanceWatcher(self.mngr)
+        events = []
+        watcher.subscribe(events.append)
+        stops = []
+        watcher.subscribe(stops.append, kinds=['stopped'])
+        self.assertEqual(watcher.poll(), [])
+
+        self.mngr.start('A')
+        self.mngr.create('B')
+        self.mngr.share('A', 'SharedA')
+        watcher.poll()
+        self.assertEqual(
+            sorted((e.kind, e.name) for e in events),
+            [('created', 'B'), ('share_changed', 'A'), ('started', 'A')])
+        self.assertEqual(watcher.latest('a').state, 'Running')
+        self.assertEqual(self.mngr.get('A').info().state, 'Running')
+
+        self.mngr.stop('A')
+        self.mngr.delete('B')
+        kinds = sorted(e.kind for e in watcher.poll())
+        self.assertEqual(kinds, ['deleted', 'stopped'])
+        self.assertEqual([e.name for e in stops], ['A'])
+        self.assertEqual(list(watcher.snapshot()), ['a'])
+
+    def test_restart(self):
+        """ Reports a restart between polls and updates the manager's cache.
+        """
+        self.mngr.create('A', start=True)
+        watcher = localdb.InstanceWatcher(self.mngr)
+        watcher.poll()
+        self.fake.INFO = FakeExecutor.INFO.replace('9:15:02', '9:20:00')
+        events = watcher.poll()
+        self.assertEqual(
+            [(e.kind, e.name) for e in events],
+            [('stopped', 'A'), ('started', 'A')])
+        self.assertEqual(
+            self.mngr.get('A').info().last_start.minute, 20)
+
+        # Changes that emit no event still reach the manager.
+        self.mngr.stop('A')
+        watcher.poll()
+        self.fake.INFO = FakeExecutor.INFO
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(
+            self.mngr.get('A').info().last_start.minute, 15)
+
+    def test_info_failure(self):
+        """ Keeps reporting other instances when one cannot be queried.
+        """
+        self.mngr.create('A')
+        self.mngr.create('B')
+        watcher = localdb.InstanceWatcher(self.mngr)
+        watcher.poll()
+        self.mngr.start('A')
+        self.mngr.create('C')
+        info = self.mngr.info
+
+        def flaky(name=''):
+            if name in ('B', 'C'):
+                raise localdb.LocalDBError('Gone.')
+            return info(name)
+
+        with mock.patch.object(self.mngr, 'info', side_effect=flaky):
+            events = watcher.poll()
+        self.assertEqual([(e.kind, e.name) for e in events], [('started', 'A')])
+        self.assertEqual(watcher.latest('B').state, 'Stopped')
+        self.assertIsNone(watcher.latest('C'))
+        self.assertIsInstance(watcher.last_error, localdb.LocalDBError)
+
+    def test_adaptive_interval(self):
+        """ Backs off while idle and polls quickly after a change.
+        """
+        watcher = localdb.InstanceWatcher(
+            self.mngr, min_interval=1.0, max_interval=2.0)
+        watcher.poll()
+        watcher.poll()
+        self.assertEqual(watcher.interval, 2.0)
+        self.mngr.create('A')
+        watcher.poll()
+        self.assertEqual(watcher.interval, 1.0)
+        with self.assertRaises(ValueError):
+            watcher.subscribe(print, kinds=['exploded'])
+
+
+class LoadTestCase(ut.TestCase):
+
+    def test_threads(self):
+        """ Reports throughput and latency percentiles against a fake backend.
+        """
+        report = localdb.run_load(
+            'dsn', [(3, 'SELECT 1'), (1, 'UPDATE t SET x = 1')], clients=3,
+            duration=0.2, connect=localdb.FakeODBC(latency=0.002), seed=1)
+        self.assertEqual(report.clients, 3)
+        self.assertGreater(report.requests, 10)
+        self.assertEqual(report.errors, 0)
+        self.assertGreater(report.qps, 0)
+        self.assertTrue(
+            0.002 <= report.p50 <= report.p90 <= report.p99 <= report.max)
+
+    def test_slow_connect(self):
+        """ Starts each client's clock after it connects.
+        """
+        import time
+        backend = localdb.FakeODBC(latency=0.002)
+
+        def connect(dsn, autocommit):
+            time.sleep(0.3)
+            return backend(dsn, autocommit)
+
+        report = localdb.run_load(
+            'dsn', clients=2, duration=0.2, connect=connect)
+        self.assertGreater(report.requests, 20)
+        self.assertLess(report.duration, 0.3)
+        self.assertGreater(report.qps, report.requests / 0.3)
+
+    def test_processes_and_errors(self):
+        """ Runs clients in processes and counts failed statements.
+        """
+        backend = localdb.FakeODBC(latency=0.001, error_rate=0.5)
+        report = localdb.run_load(
+            'dsn', clients=2, duration=0.2, mode='process', connect=backend)
+        self.assertGreater(report.errors, 0)
+        self.assertGreater(report.requests, 0)
+
+
+# Sample SQLLocalDB.exe output, used by the parser tests and benchmark.
+INFO_CORPUS = [
+    FakeExecutor.INFO.format(
+        name='MSSQLLocalDB', shared='', state='Running',
+        pipe=r'np:\\.\pipe\LOCALDB#5E21D8C2\tsql\query'),
+    FakeExecutor.INFO.format(
+        name='Test Instance', shared='Shared', state='Stopped', pipe=''),
+    (
+        'Name:               v11.0\r\n'
+        'Version:            11.0.2100.60\r\n'
+        'Shared name:\r\n'
+        'Owner:              HOST\\user\r\n'
+        'Auto-create:        Yes\r\n'
+        'State:              Stopped\r\n'
+        'Last start time:    19/10/2026 21:15:02\r\n'
+        'Instance pipe name:\r\n'
+    ),
+]
+
+VERSIONS_CORPUS = (
+    'Microsoft SQL Server 2012 (11.0.2100.60)\r\n'
+    'Microsoft SQL Server 2014 (12.0.2000.8)\r\n'
+    'Microsoft SQL Server 2016 (13.1.4001.0)\r\n'
+    'Microsoft SQL Server 2017 (14.0.1000.169)\r\n'
+)
+
+
+class ParserTestCase(ut.TestCase):
+
+    def test_parse_info(self):
+        """ Parses info output into typed fields.
+        """
+        import datetime
+        running, shared, old = [localdb.parse_info(d) for d in INFO_CORPUS]
+        self.assertEqual(running.name, 'MSSQLLocalDB')
+        self.assertEqual(running.version, (13, 1, 4001, 0))
+        self.assertEqual(str(running.version), '13.1.4001.0')
+        self.assertIs(running.state, localdb.InstanceState.RUNNING)
+        self.assertEqual(
+            running.last_start, datetime.datetime(2026, 10, 19, 9, 15, 2))
+        self.assertFalse(running.auto_create)
+        self.assertTrue(running.pipe_name.endswith(r'\tsql\query'))
+        self.assertEqual(shared.shared_name, 'Shared')
+        self.assertEqual(shared.state, 'Stopped')
+        self.assertEqual(old.name, 'v11.0')
+        self.assertTrue(old.auto_create)
+        self.assertEqual(old.pipe_name, '')
+        self.assertEqual(
+            old.last_start, datetime.datetime(2026, 10, 19, 21, 15, 2))
+        self.assertEqual(
+            localdb.InstanceInfo.from_dict(localdb._jsonable(running)),
+            running)
+        blank = localdb.InstanceInfo.from_dict(
+            dict.fromkeys(localdb.InstanceInfo._fields))
+        self.assertEqual(blank.version, localdb.Version())
+        self.assertIs(blank.state, localdb.InstanceState.UNKNOWN)
+        with self.assertRaises(localdb.LocalDBError):
+            localdb.parse_info('LocalDB instance "X" does not exist!\n')
+
+    def test_state_text(self):
+        """ Formats states as the SQLLocalDB.exe text.
+        """
+        state = localdb.InstanceState.RUNNING
+        self.assertEqual(str(state), 'Running')
+        self.assertEqual(f'{state}', 'Running')
+        self.assertEqual('%s' % state, 'Running')
+        self.assertEqual(f'{state:>8}', ' Running')
+
+    def test_parse_versions(self):
+        """ Parses versions output into integer version numbers.
+        """
+        versions = localdb.parse_versions(VERSIONS_CORPUS)
+        self.assertEqual(len(versions), 4)
+        self.assertEqual(versions[0].name, 'Microsoft SQL Server 2012')
+        self.assertEqual(versions[3].version, (14, 0, 1000, 169))
+        self.assertEqual(versions[3][2:], (14, 0, 1000, 169))
+        self.assertEqual(max(v.version for v in versions), versions[3].version)
+        self.assertEqual(
+            localdb.ServerVersion.from_dict(localdb._jsonable(versions[1])),
+            versions[1])
+
+    def test_fuzz(self):
+        """ Garbled output either parses or raises LocalDBError.
+        """
+        import random
+        rand = random.Random(1234)
+        alphabet = 'abcNamestVrion:()0123456789. \t\r\n\\#-/'
+        for _ in range(2000):
+            text = list(rand.choice(INFO_CORPUS) + VERSIONS_CORPUS)
+            for _ in range(rand.randint(1, 20)):
+                op = rand.random()
+                pos = rand.randrange(len(text))
+                if op < 0.4:
+                    text[pos] = rand.choice(alphabet)
+                elif op < 0.7:
+                    del text[pos]
+                else:
+                    text.insert(pos, rand.choice(alphabet))
+            text = ''.join(text)
+            for v in localdb.parse_versions(text):
+                self.assertEqual(v.version, tuple(v[2:]))
+            try:
+                info = localdb.parse_info(text)
+            except localdb.LocalDBError:
+                continue
+            self.assertTrue(info.name)
+            self.assertIsInstance(info.state, localdb.InstanceState)
+
+
+@ut.skipUnless(
+    __import__('os').environ.get('LOCALDB_BENCH'), 'Set LOCALDB_BENCH to run.')
+class ParserBenchmark(ut.TestCase):
+
+    def test_benchmark(self):
+        """ Times the parsers over the corpus.
+        """
+        import timeit
+        n = 20000
+        t = timeit.timeit(
+            lambda: [localdb.parse_info(d) for d in INFO_CORPUS], number=n)
+        print(f'\nparse_info: {t / n / len(INFO_CORPUS) * 1e6:.2f} us/record')
+        t = timeit.timeit(
+            lambda: localdb.parse_versions(VERSIONS_CORPUS), number=n)
+        print(f'parse_versions: {t / n * 1e6:.2f} us/call')
+
+
+class ScriptedCursor(object):
+    """ pyodbc cursor stand-in with several result sets and messages.
+    """
+
+    def __init__(self, sets):
+        self.sets = list(sets)
+        self.nextset()
+
+    def nextset(self):
+        if not self.sets:
+            return False
+        if isinstance(self.sets[0], Exception):
+            raise self.sets.pop(0)
+        columns, rows, messages = self.sets.pop(0)
+        self.description = [(c,) for c in columns] if columns else None
+        self.rows = list(rows)
+        self.messages = [('[01000]', m) for m in messages]
+        return True
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class BackupTestCase(PooledTestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        super().setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.sql = []
+        self.checksums = 1
+        self.conn.execute.side_effect = self.execute
+        self.inst = self.mngr.create('Test', start=True)
+
+    def execute(self, sql, *params):
+        self.sql.append(sql)
+        if 'sys.master_files' in sql:
+            return ScriptedCursor([(['size'], [(8 * 2**20,)], [])])
+        if 'SERVERPROPERTY' in sql:
+            return ScriptedCursor([(['path'], [(self.tmpdir,)], [])])
+        if 'FILELISTONLY' in sql:
+            columns = ['LogicalName', 'PhysicalName', 'Type', 'Size']
+            rows = [('db', 'x.mdf', 'D', 2**20), ('db_log', 'x.ldf', 'L', 0)]
+            return ScriptedCursor([(columns, rows, [])])
+        if 'HEADERONLY' in sql:
+            columns = ['BackupName', 'HasBackupChecksums']
+            return ScriptedCursor([(columns, [(None, self.checksums)], [])])
+        return ScriptedCursor([
+            (None, [], ['10 percent processed.', '55 percent processed.']),
+            (None, [], ['Processed 100 pages for database.']),
+        ])
+
+    def test_backup(self):
+        """ Writes a striped, checksummed backup, reporting progress.
+        """
+        path = self.tmpdir + '/db.bak'
+        done = []
+        paths = self.inst.backup(
+            'db', path, stripes=2, verify=True, progress=done.append)
+        self.assertEqual(
+            paths, [self.tmpdir + '/db_1.bak', self.tmpdir + '/db_2.bak'])
+        backup = self.sql[1]
+        self.assertIn('BACKUP DATABASE [db]', backup)
+        self.assertIn(f"DISK = N'{paths[1]}'", backup)
+        self.assertIn('CHECKSUM', backup)
+        self.assertNotIn('COMPRESSION', backup)
+        self.assertIn('VERIFYONLY', self.sql[2])
+        self.assertIn('WITH CHECKSUM', self.sql[2])
+        self.assertEqual(done, [10, 55, 100])
+
+    def test_backup_no_checksum(self):
+        """ Verifies a backup without checksums without asking for them.
+        """
+        self.inst.backup(
+            'db', self.tmpdir + '/db.bak', checksum=False, verify=True)
+        self.assertNotIn('CHECKSUM', self.sql[1])
+        self.assertIn('WITH NO_CHECKSUM', self.sql[2])
+
+    def test_backup_stale_stripes(self):
+        """ Deletes files left by earlier backups with more or fewer stripes.
+        """
+        import os
+        path = os.path.join(self.tmpdir, 'db.bak')
+        for name in ('db.bak', 'db_1.bak', 'db_2.bak', 'db_3.bak'):
+            open(os.path.join(self.tmpdir, name), 'w').close()
+        paths = self.inst.backup('db', path, stripes=2)
+        for p in paths:
+            open(p, 'w').close()
+        self.assertEqual(localdb._find_stripes(path), paths)
+        self.assertFalse(os.path.exists(path))
+        self.inst.backup('db', path)
+        self.assertEqual(localdb._find_stripes(path), [])
+
+    def test_backup_verify_fails(self):
+        """ Raises when verification reports an error in a later result set.
+        """
+        execute = self.execute
+
+        def failing(sql, *params):
+            if 'VERIFYONLY' in sql:
+                self.sql.append(sql)
+                return ScriptedCursor([
+                    (None, [], ['The backup set on file 1 is valid.']),
+                    RuntimeError('Checksum verification failed.'),
+                ])
+            return execute(sql, *params)
+
+        self.conn.execute.side_effect = failing
+        with self.assertRaises(RuntimeError):
+            self.inst.backup('db', self.tmpdir + '/db.bak', verify=True)
+        self.assertIn('VERIFYONLY', self.sql[-1])
+
+    def test_backup_space(self):
+        """ Refuses to start a backup that cannot fit on the disk.
+        """
+        import shutil
+        usage = shutil.disk_usage(self.tmpdir)._replace(free=1024)
+        with mock.patch('shutil.disk_usage', return_value=usage):
+            with self.assertRaises(localdb.LocalDBError):
+                self.inst.backup('db', self.tmpdir + '/db.bak')
+        self.assertFalse(any('BACKUP' in sql for sql in self.sql))
+
+    def test_restore(self):
+        """ Finds stripes and moves files into the default data folder.
+        """
+        import os
+        for i in (1, 2):
+            open(os.path.join(self.tmpdir, f'db_{i}.bak'), 'w').close()
+        done = []
+        name = self.inst.restore(
+            self.tmpdir + '/db.bak', 'copy', replace=True,
+            progress=done.append)
+        self.assertEqual(name, 'copy')
+        restore = self.sql[-1]
+        self.assertIn('RESTORE DATABASE [copy]', restore)
+        self.assertIn('db_2.bak', restore)
+        mdf = os.path.join(self.tmpdir, 'copy.mdf')
+        self.assertIn(f"MOVE N'db' TO N'{mdf}'", restore)
+        self.assertIn('_log.ldf', restore)
+        self.assertIn('REPLACE', restore)
+        self.assertIn('CHECKSUM', restore)
+        self.assertEqual(done, [10, 55, 100])
+
+        self.checksums = 0
+        self.inst.restore(self.tmpdir + '/db.bak', 'copy', replace=True)
+        self.assertNotIn('CHECKSUM', self.sql[-1])
+        self.inst.restore(self.tmpdir + '/db.bak', 'copy', checksum=True)
+        self.assertIn('CHECKSUM', self.sql[-1])
+        with self.assertRaises(localdb.LocalDBError):
+            self.inst.restore(self.tmpdir + '/missing.bak', 'copy')